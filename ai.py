@@ -0,0 +1,205 @@
+"""Move choice for the computer player.
+
+Strength levels map to search budgets, so each deployment can trade CPU
+time for playing strength. 'random' keeps the original behaviour: a random
+capture if there is one, else a random move. 'fast' does not search
+either: it plays the move that wins the most material by static exchange
+evaluation, so it takes free pieces and stops giving its own away. With
+more than one worker the search runs on several cores (see parallel.py).
+AIMoveTask thinks on a background thread so a GUI can keep drawing and
+handling events. It can also ponder: search the position after the
+opponent's predicted reply (predict_reply) while the opponent thinks, so
+that a right guess is answered from a search that is already finished or
+well under way. While the position is in the opening book, every level
+plays book moves, and in endgames the tablebases cover, every level plays
+the tablebase move.
+"""
+
+import os
+import random
+import threading
+
+from book import OpeningBook
+from parallel import ParallelSearcher
+from search import Searcher, is_capture, static_exchange
+from tablebase import DEFAULT_DIRECTORY as DEFAULT_TABLEBASE_DIRECTORY
+from tablebase import Tablebases
+from tt import TranspositionTable
+
+# level -> Searcher budget (None for the levels that do not search, see PICKERS)
+LEVELS = {
+    'random': None,
+    'fast': None,
+    'easy': {'max_depth': 2, 'max_time': 0.25},
+    'medium': {'max_depth': 4, 'max_time': 1.0},
+    'hard': {'max_time': 3.0},
+    'expert': {'max_time': 10.0},
+}
+DEFAULT_LEVEL = 'medium'
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.bin')
+
+
+def open_book(path=DEFAULT_BOOK_PATH):
+    """Open an opening book, or return None if there is no such file"""
+    if path is None or not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+def open_tablebases(directory=DEFAULT_TABLEBASE_DIRECTORY):
+    """Open a tablebase directory, or return None if there is no such directory"""
+    if directory is None or not os.path.isdir(directory):
+        return None
+    return Tablebases(directory)
+
+
+def random_move(position):
+    """Pick a random capture if one exists, else a random legal move"""
+    moves = position.legal_moves()
+    if not moves:
+        return None
+    captures = [move for move in moves if is_capture(position, move)]
+    return random.choice(captures or moves)
+
+
+def exchange_move(position):
+    """Pick a move that nets the most material by static exchange, at random among equals.
+
+    A mating move comes first and a stalemating one last.
+    """
+    moves = position.legal_moves()
+    if not moves:
+        return None
+    keys = []
+    for move in moves:
+        position.make_move(move)
+        outcome = 0
+        if not position.has_legal_moves(position.current_turn):
+            outcome = 1 if position.is_in_check(position.current_turn) else -1
+        position.unmake_move()
+        keys.append((outcome, static_exchange(position, move)))
+    best = max(keys)
+    return random.choice([move for move, key in zip(moves, keys) if key == best])
+
+
+# level -> move picker, for the levels that do not search
+PICKERS = {'random': random_move, 'fast': exchange_move}
+
+
+def make_searcher(level=DEFAULT_LEVEL, table=None, stop_event=None, workers=1, tablebases=None,
+                  table_megabytes=None):
+    """Create a searcher with the budget of a strength level.
+
+    With workers > 1 it is a ParallelSearcher, which owns worker processes:
+    keep it for the whole game and close() it afterwards. Its workers do
+    not probe tablebases. table_megabytes sizes a new transposition table
+    (default: 16 MB, or 64 MB shared by the workers).
+    """
+    if workers > 1:
+        sizing = {'table_megabytes': table_megabytes} if table_megabytes is not None else {}
+        return ParallelSearcher(workers=workers, stop_event=stop_event, **sizing, **LEVELS[level])
+    if table is None and table_megabytes is not None:
+        table = TranspositionTable(table_megabytes)
+    return Searcher(table=table, stop_event=stop_event, tablebases=tablebases, **LEVELS[level])
+
+
+def choose_ai_move(position, level=DEFAULT_LEVEL, table=None, searcher=None, book=None, tablebases=None):
+    """Return the move the AI plays in this position, or None if it has none.
+
+    Pass a searcher from make_searcher to reuse it (and its table) across
+    moves, an OpeningBook to play from it before searching, and Tablebases
+    to play perfectly once they cover the position.
+    """
+    if book is not None:
+        move = book.choose_move(position)
+        if move is not None:
+            return move
+    if tablebases is not None:
+        move = tablebases.best_move(position)
+        if move is not None:
+            return move
+    if LEVELS[level] is None:
+        return PICKERS[level](position)
+    if searcher is None:
+        searcher = make_searcher(level, table)
+    return searcher.search(position).move
+
+
+def predict_reply(position, searcher=None, book=None, tablebases=None):
+    """Guess the side to move's move, or return None if there is no guess.
+
+    The guess is the main book move, else the tablebase move, else the
+    move the searcher's table holds for the position. Right after the AI
+    has moved, the table move is the second move of its principal
+    variation.
+    """
+    legal = position.legal_moves()
+    if book is not None:
+        for move, weight in book.probe(position.hash_key):
+            if move in legal and weight:
+                return move
+    if tablebases is not None:
+        move = tablebases.best_move(position)
+        if move is not None:
+            return move
+    if searcher is not None:
+        entry = searcher.table.probe(position.hash_key)
+        if entry is not None and entry[0] in legal:
+            return entry[0]
+    return None
+
+
+class AIMoveTask:
+    """Choose the AI's move on a background thread.
+
+    The search runs on a copy of the position, so the caller may keep
+    reading (and drawing) the original meanwhile. Poll done(), then read
+    move; cancel() stops the search early, which then reports the best
+    move found so far.
+
+    With ponder_move, the task thinks about the position after that move
+    instead, on the opponent's time. Its budget runs from the start, so
+    once the opponent plays ponder_move the answer takes at most what is
+    left of it; if they play anything else, cancel() the task.
+    """
+
+    def __init__(self, position, level=DEFAULT_LEVEL, searcher=None, book=None, tablebases=None,
+                 ponder_move=None):
+        self.move = None
+        self.error = None
+        self.ponder_move = ponder_move
+        self._position = position.copy()
+        if ponder_move is not None:
+            self._position.make_move(ponder_move)
+        self.hash_key = self._position.hash_key  # The move only applies if the position is unchanged
+        self._level = level
+        self._searcher = searcher
+        self._book = book
+        self._tablebases = tablebases
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ai-move', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            if self._searcher is not None:
+                self._searcher.stop_event = self._stop
+            self.move = choose_ai_move(self._position, self._level, searcher=self._searcher, book=self._book,
+                                       tablebases=self._tablebases)
+        except Exception as error:  # Re-raised on the caller's thread by result()
+            self.error = error
+
+    def done(self):
+        return not self._thread.is_alive()
+
+    def cancel(self, wait=True):
+        """Ask the search to stop, by default waiting until it has"""
+        self._stop.set()
+        if wait:
+            self._thread.join()
+
+    def result(self):
+        """The chosen move (None if there is none); only valid once done()"""
+        if self.error is not None:
+            raise self.error
+        return self.move
@@ -0,0 +1,331 @@
+"""Benchmarks for the rules engine, printed as JSON so runs can be diffed.
+
+    python bench.py perft --depth 4
+    python bench.py perft --suite --depth 3 --backend legal --backend bitboard
+    python bench.py perft --fen "<fen>" --depth 3 --divide
+    python bench.py search --suite --depth 4
+    python bench.py search --suite --time 5 --workers 1 --workers 4
+    python bench.py consistency --suite --walks 40 --plies 80
+
+perft counts the leaf nodes of the legal move tree. The suite positions
+come with published node counts, so a mismatch means a move generator bug
+and makes the command exit with status 1. search runs the AI's alpha-beta
+search to a fixed depth (or time) and reports nodes, speed, how well
+moves were ordered and how full the transposition table got; with
+several --workers values it also reports how nodes per second scale with
+the number of worker processes. Each worker count gets one pool, started
+and warmed up before any search is timed.
+consistency plays random moves, taking some back, and after every step
+compares the state make_move and unmake_move keep incrementally (attack
+maps, hash, evaluation sums) with a recomputation; like perft, a mismatch
+makes the command exit with status 1.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from bitboard import BitboardPosition
+from engine import START_FEN, Position, move_to_uci
+from parallel import ParallelSearcher
+from search import Searcher
+from tt import TranspositionTable
+
+PERFT_SUITE = [
+    {'name': 'start', 'fen': START_FEN,
+     'nodes': [20, 400, 8902, 197281, 4865609]},
+    {'name': 'kiwipete', 'fen': 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     'nodes': [48, 2039, 97862, 4085603]},
+    {'name': 'position3', 'fen': '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     'nodes': [14, 191, 2812, 43238, 674624]},
+    {'name': 'position4', 'fen': 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     'nodes': [6, 264, 9467, 422333]},
+    {'name': 'position5', 'fen': 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     'nodes': [44, 1486, 62379, 2103487]},
+    {'name': 'position6', 'fen': 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     'nodes': [46, 2079, 89890, 3894594]},
+]
+
+
+def simulated_legal_moves(position):
+    """Legal moves the way check_moves used to find them: try every
+    pseudo-legal move and keep those that do not leave the king in check"""
+    color = position.current_turn
+    moves = []
+    for move in position.pseudo_legal_moves(color):
+        position.make_move(move)
+        if not position.is_in_check(color):
+            moves.append(move)
+        position.unmake_move()
+    return moves
+
+
+# name -> (position factory, legal move generator)
+BACKENDS = {
+    'legal': (Position.from_fen, lambda position: list(position.iter_legal_moves())),  # Generation, not the cache
+    'simulate': (Position.from_fen, simulated_legal_moves),
+    'bitboard': (BitboardPosition.from_fen, lambda position: position.legal_moves()),
+}
+
+
+def perft(position, depth, generate):
+    """Count the leaf nodes of the legal move tree to the given depth"""
+    if depth == 0:
+        return 1
+    moves = generate(position)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1, generate)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position, depth, generate):
+    """perft split by root move, for finding which move a count goes wrong in"""
+    counts = {}
+    for move in generate(position):
+        position.make_move(move)
+        counts[move_to_uci(move)] = perft(position, depth - 1, generate)
+        position.unmake_move()
+    return dict(sorted(counts.items()))
+
+
+def run_perft(name, fen, depth, backend, expected=None, split=False):
+    """Run one perft and describe it as a JSON-ready dict"""
+    factory, generate = BACKENDS[backend]
+    position = factory(fen)
+    start = time.perf_counter()
+    if split:
+        counts = divide(position, depth, generate)
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(position, depth, generate)
+    seconds = time.perf_counter() - start
+    result = {
+        'name': name,
+        'backend': backend,
+        'fen': fen,
+        'depth': depth,
+        'nodes': nodes,
+        'expected': expected,
+        'ok': expected is None or nodes == expected,
+        'seconds': round(seconds, 4),
+        'nodes_per_second': round(nodes / seconds) if seconds > 0 else None,
+    }
+    if split:
+        result['divide'] = counts
+    return result
+
+
+def perft_command(args):
+    """Run perft over the chosen positions and backends"""
+    known = {entry['fen']: entry['nodes'] for entry in PERFT_SUITE}
+    jobs = []
+    for name, fen in _positions(args):
+        counts = known.get(fen, [])
+        jobs.append((name, fen, min(args.depth, len(counts)) if args.suite else args.depth, counts))
+
+    results = []
+    for backend in args.backend or ['legal']:
+        for name, fen, depth, counts in jobs:
+            expected = counts[depth - 1] if 0 < depth <= len(counts) else None
+            results.append(run_perft(name, fen, depth, backend, expected, args.divide))
+
+    return {
+        'command': 'perft',
+        'python': platform.python_version(),
+        'ok': all(result['ok'] for result in results),
+        'results': results,
+    }
+
+
+def incremental_mismatches(position):
+    """Names of the incrementally kept fields that differ from a recomputation"""
+    mismatches = []
+    if position.hash_key != position.compute_hash():
+        mismatches.append('hash_key')
+    if (position.middlegame_score, position.endgame_score, position.phase) != position.compute_evaluation():
+        mismatches.append('evaluation')
+    attacks = position.attacks
+    if position.compute_attacks() != attacks:  # Also repairs the maps, so later steps are checked on their own
+        mismatches.append('attacks')
+    return mismatches
+
+
+def random_walk(position, plies, rng):
+    """Play random moves, taking one back a quarter of the time, then take all back.
+
+    Yields a description of each step once it has been played.
+    """
+    for _ in range(plies):
+        moves = position.legal_moves()
+        if position.history and (not moves or rng.random() < 0.25):
+            yield 'unmake ' + move_to_uci(position.unmake_move())
+        elif moves:
+            move = rng.choice(moves)
+            position.make_move(move)
+            yield 'make ' + move_to_uci(move)
+    while position.history:
+        yield 'unmake ' + move_to_uci(position.unmake_move())
+
+
+def run_consistency(name, fen, walks, plies, rng):
+    """Check the incremental state after every step of random walks from one position"""
+    steps = failures = 0
+    first_failure = None
+    for _ in range(walks):
+        position = Position.from_fen(fen)
+        for step in random_walk(position, plies, rng):
+            steps += 1
+            mismatches = incremental_mismatches(position)
+            if mismatches:
+                failures += 1
+                if first_failure is None:
+                    first_failure = {'after': step, 'fen': position.to_fen(), 'fields': mismatches}
+    return {'name': name, 'fen': fen, 'steps': steps, 'mismatches': failures, 'ok': not failures,
+            'first_mismatch': first_failure}
+
+
+def consistency_command(args):
+    """Check the incremental state over random walks from the chosen positions"""
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    results = [run_consistency(name, fen, args.walks, args.plies, rng) for name, fen in _positions(args)]
+    return {
+        'command': 'consistency',
+        'python': platform.python_version(),
+        'ok': all(result['ok'] for result in results),
+        'steps': sum(result['steps'] for result in results),
+        'seconds': round(time.perf_counter() - start, 4),
+        'results': results,
+    }
+
+
+def _positions(args):
+    """(name, fen) pairs selected by --suite / --fen"""
+    if args.suite:
+        return [(entry['name'], entry['fen']) for entry in PERFT_SUITE]
+    return [('custom' if args.fen else 'start', args.fen or START_FEN)]
+
+
+def search_command(args):
+    """Search each chosen position and report the effort it took"""
+    results = []
+    scaling = []
+    for workers in args.workers or [1]:
+        if workers > 1:
+            # One pool per worker count, started before the clock runs
+            sizing = {'table_megabytes': args.table_megabytes} if args.table_megabytes is not None else {}
+            with ParallelSearcher(workers=workers, max_depth=args.depth, max_time=args.time, **sizing) as searcher:
+                _warm_up(searcher)
+                worker_results = [_search_position(name, fen, workers, args, searcher)
+                                  for name, fen in _positions(args)]
+        else:
+            worker_results = [_search_position(name, fen, workers, args) for name, fen in _positions(args)]
+        nodes = sum(result['nodes'] for result in worker_results)
+        seconds = sum(result['seconds'] for result in worker_results)
+        scaling.append({'workers': workers, 'nodes': nodes,
+                        'nodes_per_second': round(nodes / seconds) if seconds > 0 else None})
+        results.extend(worker_results)
+    for entry in scaling:
+        if entry['nodes_per_second'] and scaling[0]['nodes_per_second']:
+            entry['speedup'] = round(entry['nodes_per_second'] / scaling[0]['nodes_per_second'], 2)
+    return {
+        'command': 'search',
+        'python': platform.python_version(),
+        'ok': True,
+        'total_nodes': sum(result['nodes'] for result in results),
+        'scaling': scaling,
+        'results': results,
+    }
+
+
+def _warm_up(searcher):
+    """Run a depth 1 search so every worker process is started and has imported the engine"""
+    max_depth, max_time = searcher.max_depth, searcher.max_time
+    searcher.max_depth, searcher.max_time = 1, None
+    try:
+        searcher.search(Position.from_fen(START_FEN))
+    finally:
+        searcher.max_depth, searcher.max_time = max_depth, max_time
+
+
+def _search_position(name, fen, workers, args, searcher=None):
+    """Search one position and describe the result as a JSON-ready dict"""
+    if searcher is not None:
+        searcher.table.clear()  # Each position starts from an empty table, as a new Searcher does
+        result = searcher.search(Position.from_fen(fen))
+    else:
+        table = TranspositionTable(args.table_megabytes) if args.table_megabytes is not None else None
+        searcher = Searcher(table, max_depth=args.depth, max_time=args.time, move_ordering=not args.no_ordering)
+        result = searcher.search(Position.from_fen(fen))
+    return {
+        'name': name,
+        'workers': workers,
+        'fen': fen,
+        'depth': result.depth,
+        'move': move_to_uci(result.move) if result.move else None,
+        'score': result.score,
+        'nodes': result.nodes,
+        'seconds': round(result.seconds, 4),
+        'nodes_per_second': result.nodes_per_second,
+        # Nodes per ply: the n-th root of the tree size at depth n
+        'branching_factor': round(result.nodes ** (1 / result.depth), 2) if result.depth else None,
+        'first_move_cutoff_rate': (round(result.first_move_cutoff_rate, 3)
+                                   if result.first_move_cutoff_rate is not None else None),
+        'pv': [move_to_uci(move) for move in result.pv],
+        'hashfull': searcher.table.hashfull(),  # Permille of table slots this search filled
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    perft_parser = commands.add_parser('perft', help='count legal move tree leaf nodes')
+    perft_parser.add_argument('--depth', type=int, default=3, help='search depth (capped per suite position)')
+    perft_parser.add_argument('--fen', help='position to count from (default: the start position)')
+    perft_parser.add_argument('--suite', action='store_true', help='run the standard test positions')
+    perft_parser.add_argument('--divide', action='store_true', help='report the count below each root move')
+    perft_parser.add_argument('--backend', action='append', choices=sorted(BACKENDS),
+                              help='move generator to use; repeat to compare several (default: legal)')
+
+    search_parser = commands.add_parser('search', help='run the AI search to a fixed depth')
+    search_parser.add_argument('--depth', type=int, default=4, help='iterative deepening depth limit')
+    search_parser.add_argument('--time', type=float, help='seconds per position (default: no limit)')
+    search_parser.add_argument('--fen', help='position to search (default: the start position)')
+    search_parser.add_argument('--suite', action='store_true', help='search the standard test positions')
+    search_parser.add_argument('--no-ordering', action='store_true',
+                               help='search moves in generation order (one worker only)')
+    search_parser.add_argument('--workers', type=int, action='append',
+                               help='worker processes (Lazy SMP); repeat to compare several (default: 1)')
+    search_parser.add_argument('--table-megabytes', type=float,
+                               help='transposition table size (default: 16, or 64 shared by several workers)')
+
+    consistency_parser = commands.add_parser('consistency',
+                                             help='check incremental make/unmake state against recomputation')
+    consistency_parser.add_argument('--fen', help='position to start from (default: the start position)')
+    consistency_parser.add_argument('--suite', action='store_true', help='start from the standard test positions')
+    consistency_parser.add_argument('--walks', type=int, default=20, help='random walks per position')
+    consistency_parser.add_argument('--plies', type=int, default=60, help='moves per walk')
+    consistency_parser.add_argument('--seed', type=int, default=0, help='seed for the random moves')
+
+    args = parser.parse_args(argv)
+    if args.command == 'search' and args.no_ordering and any(workers > 1 for workers in args.workers or []):
+        # The worker processes' searchers always order moves
+        search_parser.error('--no-ordering only applies to single-worker searches')
+    handlers = {'perft': perft_command, 'search': search_command, 'consistency': consistency_command}
+    report = handlers[args.command](args)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0 if report['ok'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,395 @@
+"""Bitboard move generator.
+
+An alternative backend to engine.Position that stores the position as one
+64-bit integer per (color, piece type). Bit n stands for the square with
+row * 8 + col == n, the same numbering as engine.Position.board. Knight,
+king and pawn attacks come from precomputed tables and slider attacks from
+precomputed rays cut at the first blocker, so move generation works on
+whole sets of squares instead of walking directions one step at a time.
+"""
+
+from engine import (BOARD_SIZE, CASTLING_MOVES, CASTLING_RIGHTS_MASKS, CASTLING_ROOK_COLS, KING_OFFSETS,
+                    KNIGHT_OFFSETS, PROMOTION_TYPES, Position, is_valid_board_position)
+
+COLORS = ['white', 'black']
+PIECE_TYPES = ['pawn', 'knight', 'bishop', 'rook', 'queen', 'king']
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+WHITE, BLACK = 0, 1
+
+FULL = (1 << 64) - 1
+
+# Ray directions as (row, col) steps. The first four run towards higher
+# square numbers, so their first blocker is the lowest set bit; the other
+# four run towards lower square numbers and use the highest set bit.
+POSITIVE_DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1)]
+NEGATIVE_DIRECTIONS = [(-1, 0), (0, -1), (-1, -1), (-1, 1)]
+STRAIGHT = {(1, 0), (0, 1), (-1, 0), (0, -1)}
+
+
+def _step_table(offsets):
+    """Attack set of a one-step piece on every square"""
+    table = []
+    for square in range(64):
+        row, col = divmod(square, BOARD_SIZE)
+        bb = 0
+        for d_row, d_col in offsets:
+            if is_valid_board_position(row + d_row, col + d_col):
+                bb |= 1 << ((row + d_row) * BOARD_SIZE + col + d_col)
+        table.append(bb)
+    return table
+
+
+def _ray_table(d_row, d_col):
+    """Squares reached from every square in one direction on an empty board"""
+    table = []
+    for square in range(64):
+        row, col = divmod(square, BOARD_SIZE)
+        bb = 0
+        row, col = row + d_row, col + d_col
+        while is_valid_board_position(row, col):
+            bb |= 1 << (row * BOARD_SIZE + col)
+            row, col = row + d_row, col + d_col
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table(KNIGHT_OFFSETS)
+KING_ATTACKS = _step_table(KING_OFFSETS)
+# PAWN_ATTACKS[color][square]: squares a pawn of that color on square attacks
+PAWN_ATTACKS = [_step_table([(-1, -1), (-1, 1)]), _step_table([(1, -1), (1, 1)])]
+
+STRAIGHT_POSITIVE_RAYS = [_ray_table(*d) for d in POSITIVE_DIRECTIONS if d in STRAIGHT]
+STRAIGHT_NEGATIVE_RAYS = [_ray_table(*d) for d in NEGATIVE_DIRECTIONS if d in STRAIGHT]
+DIAGONAL_POSITIVE_RAYS = [_ray_table(*d) for d in POSITIVE_DIRECTIONS if d not in STRAIGHT]
+DIAGONAL_NEGATIVE_RAYS = [_ray_table(*d) for d in NEGATIVE_DIRECTIONS if d not in STRAIGHT]
+
+
+def _line_tables():
+    """BETWEEN[a][b]: squares strictly between a and b on a shared line;
+    LINE[a][b]: the whole board line through a and b (0 if not aligned)"""
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    rays = {d: _ray_table(*d) for d in POSITIVE_DIRECTIONS + NEGATIVE_DIRECTIONS}
+    for square in range(64):
+        row, col = divmod(square, BOARD_SIZE)
+        for d_row, d_col in rays:
+            full_line = rays[(d_row, d_col)][square] | rays[(-d_row, -d_col)][square] | (1 << square)
+            path = 0
+            new_row, new_col = row + d_row, col + d_col
+            while is_valid_board_position(new_row, new_col):
+                target = new_row * BOARD_SIZE + new_col
+                between[square][target] = path
+                line[square][target] = full_line
+                path |= 1 << target
+                new_row, new_col = new_row + d_row, new_col + d_col
+    return between, line
+
+
+BETWEEN, LINE = _line_tables()
+
+RANK_BITS = [0xFF << (row * BOARD_SIZE) for row in range(BOARD_SIZE)]
+# Rank a pawn of each color may double-step from, and the rank it promotes on
+PAWN_START_RANK = [RANK_BITS[6], RANK_BITS[1]]
+PROMOTION_RANK = [RANK_BITS[0], RANK_BITS[7]]
+
+
+def _castling_table():
+    """Per color: (right, king from, king to, bits that must be empty, squares the king passes)"""
+    table = []
+    for color, row in (('white', 7), ('black', 0)):
+        entries = []
+        for right, king_col, empty_cols, passed_cols in CASTLING_MOVES[color]:
+            empty = 0
+            for col in empty_cols:
+                empty |= 1 << (row * BOARD_SIZE + col)
+            entries.append((right, row * BOARD_SIZE + 4, row * BOARD_SIZE + king_col, empty,
+                            [row * BOARD_SIZE + col for col in passed_cols]))
+        table.append(entries)
+    return table
+
+
+CASTLING = _castling_table()
+
+
+def _slider_attacks(square, occupied, positive_rays, negative_rays):
+    """Attacks along the given rays, each cut off at its first blocker"""
+    attacks = 0
+    for rays in positive_rays:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in negative_rays:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(square, occupied):
+    """Rook attack set from square given the occupied squares"""
+    return _slider_attacks(square, occupied, STRAIGHT_POSITIVE_RAYS, STRAIGHT_NEGATIVE_RAYS)
+
+
+def bishop_attacks(square, occupied):
+    """Bishop attack set from square given the occupied squares"""
+    return _slider_attacks(square, occupied, DIAGONAL_POSITIVE_RAYS, DIAGONAL_NEGATIVE_RAYS)
+
+
+def iter_squares(bb):
+    """Yield the square number of every set bit"""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+class BitboardPosition:
+    """A position stored as bitboards, with the same rules as engine.Position"""
+
+    def __init__(self):
+        # pieces[color][piece_type] is the bitboard of those pieces
+        self.pieces = [[0] * 6, [0] * 6]
+        self.occupied = [0, 0]
+        self.current_turn = 'white'
+        self.castling_rights = 0  # Same bit flags as engine.Position
+        self.en_passant = None  # Square number, or None
+        self.history = []  # State snapshots, one per move played
+
+    @classmethod
+    def from_position(cls, position):
+        """Build a bitboard copy of an engine.Position"""
+        bitboard_position = cls()
+        for piece in position.pieces:
+            color = COLORS.index(piece.color)
+            bit = 1 << (piece.row * BOARD_SIZE + piece.col)
+            bitboard_position.pieces[color][PIECE_TYPES.index(piece.piece_type)] |= bit
+            bitboard_position.occupied[color] |= bit
+        bitboard_position.current_turn = position.current_turn
+        bitboard_position.castling_rights = position.castling_rights
+        if position.en_passant is not None:
+            bitboard_position.en_passant = position.en_passant[0] * BOARD_SIZE + position.en_passant[1]
+        return bitboard_position
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Create a bitboard position from a FEN string"""
+        return cls.from_position(Position.from_fen(fen))
+
+    def get_piece_at(self, row, col):
+        """Return (color, piece_type) of the piece on a square, or None"""
+        bit = 1 << (row * BOARD_SIZE + col)
+        for color in (WHITE, BLACK):
+            if self.occupied[color] & bit:
+                for piece_type in range(6):
+                    if self.pieces[color][piece_type] & bit:
+                        return COLORS[color], PIECE_TYPES[piece_type]
+        return None
+
+    def _attacked(self, square, attacker, occupied, mask=FULL):
+        """Is square attacked by the attacker's pieces (restricted to mask)?"""
+        enemy = self.pieces[attacker]
+        if KNIGHT_ATTACKS[square] & enemy[KNIGHT] & mask:
+            return True
+        if PAWN_ATTACKS[attacker ^ 1][square] & enemy[PAWN] & mask:
+            return True
+        if KING_ATTACKS[square] & enemy[KING]:
+            return True
+        queens = enemy[QUEEN]
+        if rook_attacks(square, occupied) & (enemy[ROOK] | queens) & mask:
+            return True
+        if bishop_attacks(square, occupied) & (enemy[BISHOP] | queens) & mask:
+            return True
+        return False
+
+    def is_square_under_attack(self, row, col, attacking_color):
+        """Check if a square is under attack by any piece of the attacking color"""
+        occupied = self.occupied[WHITE] | self.occupied[BLACK]
+        return self._attacked(row * BOARD_SIZE + col, COLORS.index(attacking_color), occupied)
+
+    def is_in_check(self, color):
+        """Check if the king of the given color is in check"""
+        us = COLORS.index(color)
+        king = self.pieces[us][KING]
+        if not king:
+            return False
+        occupied = self.occupied[WHITE] | self.occupied[BLACK]
+        return self._attacked(king.bit_length() - 1, us ^ 1, occupied)
+
+    def _pinned(self, us, king_square, occupied):
+        """Bitboard of our pieces pinned against our king"""
+        enemy = self.pieces[us ^ 1]
+        their_occupied = self.occupied[us ^ 1]
+        snipers = ((rook_attacks(king_square, their_occupied) & (enemy[ROOK] | enemy[QUEEN]))
+                   | (bishop_attacks(king_square, their_occupied) & (enemy[BISHOP] | enemy[QUEEN])))
+        pinned = 0
+        for sniper in iter_squares(snipers):
+            blockers = BETWEEN[king_square][sniper] & occupied
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers & self.occupied[us]
+        return pinned
+
+    def _generate_moves(self, us):
+        """List (from_square, to_square, promotion) for every legal move of us"""
+        own = self.occupied[us]
+        enemy = self.occupied[us ^ 1]
+        occupied = own | enemy
+        empty = ~occupied & FULL
+        pieces = self.pieces[us]
+        moves = []
+
+        # Pawns: pushes set-wise, captures from the attack table
+        pawns = pieces[PAWN]
+        pawn_moves = []
+        if us == WHITE:
+            single = (pawns >> 8) & empty
+            double = ((pawns & PAWN_START_RANK[WHITE]) >> 8 & empty) >> 8 & empty
+            pawn_moves += [(to_square + 8, to_square) for to_square in iter_squares(single)]
+            moves += [(to_square + 16, to_square, None) for to_square in iter_squares(double)]
+        else:
+            single = (pawns << 8) & empty
+            double = ((pawns & PAWN_START_RANK[BLACK]) << 8 & empty) << 8 & empty
+            pawn_moves += [(to_square - 8, to_square) for to_square in iter_squares(single)]
+            moves += [(to_square - 16, to_square, None) for to_square in iter_squares(double)]
+        pawn_attacks = PAWN_ATTACKS[us]
+        for from_square in iter_squares(pawns):
+            pawn_moves += [(from_square, to_square) for to_square in iter_squares(pawn_attacks[from_square] & enemy)]
+        promotion_rank = PROMOTION_RANK[us]
+        for from_square, to_square in pawn_moves:
+            if promotion_rank >> to_square & 1:
+                moves += [(from_square, to_square, promotion) for promotion in PROMOTION_TYPES]
+            else:
+                moves.append((from_square, to_square, None))
+
+        targets = ~own & FULL
+        for from_square in iter_squares(pieces[KNIGHT]):
+            moves += [(from_square, to_square, None)
+                      for to_square in iter_squares(KNIGHT_ATTACKS[from_square] & targets)]
+        for from_square in iter_squares(pieces[BISHOP] | pieces[QUEEN]):
+            moves += [(from_square, to_square, None)
+                      for to_square in iter_squares(bishop_attacks(from_square, occupied) & targets)]
+        for from_square in iter_squares(pieces[ROOK] | pieces[QUEEN]):
+            moves += [(from_square, to_square, None)
+                      for to_square in iter_squares(rook_attacks(from_square, occupied) & targets)]
+
+        king = pieces[KING]
+        if not king:
+            return moves
+        king_square = king.bit_length() - 1
+        them = us ^ 1
+        in_check = self._attacked(king_square, them, occupied)
+        if in_check:
+            # In check: test every move against the resulting occupancy
+            legal = []
+            for move in moves:
+                to_bit = 1 << move[1]
+                after = (occupied ^ (1 << move[0])) | to_bit
+                if not self._attacked(king_square, them, after, FULL ^ to_bit):
+                    legal.append(move)
+            moves = legal
+        else:
+            # Only pinned pieces can expose the king; they must stay on the pin line
+            pinned = self._pinned(us, king_square, occupied)
+            if pinned:
+                line = LINE[king_square]
+                moves = [move for move in moves
+                         if not pinned >> move[0] & 1 or line[move[0]] >> move[1] & 1]
+
+        # En passant removes two pawns from one rank, so test it directly
+        if self.en_passant is not None:
+            to_square = self.en_passant
+            captured_bit = 1 << (to_square + (8 if us == WHITE else -8))
+            for from_square in iter_squares(PAWN_ATTACKS[them][to_square] & pawns):
+                after = (occupied ^ (1 << from_square) ^ captured_bit) | (1 << to_square)
+                if not self._attacked(king_square, them, after, FULL ^ captured_bit):
+                    moves.append((from_square, to_square, None))
+
+        # The king may not step onto an attacked square
+        without_king = occupied ^ king
+        for to_square in iter_squares(KING_ATTACKS[king_square] & targets):
+            to_bit = 1 << to_square
+            if not self._attacked(to_square, them, without_king | to_bit, FULL ^ to_bit):
+                moves.append((king_square, to_square, None))
+
+        if not in_check and self.castling_rights:
+            for right, from_square, to_square, must_be_empty, passed in CASTLING[us]:
+                if (self.castling_rights & right and from_square == king_square and not occupied & must_be_empty
+                        and not any(self._attacked(square, them, occupied) for square in passed)):
+                    moves.append((king_square, to_square, None))
+        return moves
+
+    def legal_moves(self, color=None):
+        """List every legal move as (from_row, from_col, to_row, to_col, promotion) tuples"""
+        if color is None:
+            color = self.current_turn
+        moves = []
+        for from_square, to_square, promotion in self._generate_moves(COLORS.index(color)):
+            moves.append((from_square >> 3, from_square & 7, to_square >> 3, to_square & 7, promotion))
+        return moves
+
+    def has_legal_moves(self, color):
+        """Check if the player has any legal moves"""
+        return bool(self._generate_moves(COLORS.index(color)))
+
+    def make_move(self, move):
+        """Play a (from_row, from_col, to_row, to_col, promotion) move for the side to move"""
+        from_row, from_col, to_row, to_col, promotion = move
+        from_square = from_row * BOARD_SIZE + from_col
+        to_square = to_row * BOARD_SIZE + to_col
+        from_bit = 1 << from_square
+        to_bit = 1 << to_square
+        us = COLORS.index(self.current_turn)
+        them = us ^ 1
+        ours = self.pieces[us]
+        theirs = self.pieces[them]
+        self.history.append((ours[:], theirs[:], self.occupied[:], self.castling_rights, self.en_passant))
+
+        if self.occupied[them] & to_bit:
+            for piece_type in range(6):
+                theirs[piece_type] &= ~to_bit
+            self.occupied[them] ^= to_bit
+        for piece_type in range(6):
+            if ours[piece_type] & from_bit:
+                break
+        ours[piece_type] ^= from_bit
+        self.occupied[us] ^= from_bit | to_bit
+        if promotion is not None:
+            ours[PIECE_TYPES.index(promotion)] |= to_bit
+        else:
+            ours[piece_type] |= to_bit
+
+        new_en_passant = None
+        if piece_type == PAWN:
+            if to_square == self.en_passant:
+                captured_bit = 1 << (to_square + (8 if us == WHITE else -8))
+                theirs[PAWN] ^= captured_bit
+                self.occupied[them] ^= captured_bit
+            elif abs(to_square - from_square) == 16:
+                new_en_passant = (from_square + to_square) // 2
+        elif piece_type == KING and abs(to_col - from_col) == 2:
+            rook_from_col, rook_to_col = CASTLING_ROOK_COLS[to_col]
+            rook_bits = (1 << (from_row * BOARD_SIZE + rook_from_col)) | (1 << (from_row * BOARD_SIZE + rook_to_col))
+            ours[ROOK] ^= rook_bits
+            self.occupied[us] ^= rook_bits
+        self.en_passant = new_en_passant
+        self.castling_rights &= CASTLING_RIGHTS_MASKS[from_square] & CASTLING_RIGHTS_MASKS[to_square]
+        self.current_turn = COLORS[them]
+
+    def unmake_move(self):
+        """Take back the last move played"""
+        ours, theirs, self.occupied, self.castling_rights, self.en_passant = self.history.pop()
+        them = COLORS.index(self.current_turn)
+        self.pieces[them] = theirs
+        self.pieces[them ^ 1] = ours
+        self.current_turn = COLORS[them ^ 1]
+
+    def game_result(self):
+        """Return None while the game goes on, else the winner color or 'draw'"""
+        if self.has_legal_moves(self.current_turn):
+            return None
+        if self.is_in_check(self.current_turn):
+            return COLORS[COLORS.index(self.current_turn) ^ 1]  # Checkmate
+        return 'draw'  # Stalemate
@@ -0,0 +1,160 @@
+"""Opening book: a sorted file of (position hash, move, weight) entries.
+
+    python book.py build games.pgn book.bin --plies 16 --min-games 2
+    python book.py probe book.bin --fen "<fen>"
+
+The layout follows Polyglot: 16-byte big-endian entries of a 64-bit key,
+a 16-bit move, a 16-bit weight and 32 unused bits, sorted by key. Keys are
+this engine's Zobrist hashes and moves use tt.encode_move, so files are
+not interchangeable with Polyglot books. OpeningBook maps the file with
+mmap and finds a position by binary search: a probe touches a handful of
+pages, nothing is loaded up front, and processes that open the same book
+share its pages through the OS cache.
+"""
+
+import argparse
+import json
+import mmap
+import random
+import struct
+import sys
+
+from engine import START_FEN, Position, move_from_san, move_to_uci
+from pgn import read_games
+from tt import decode_move, encode_move
+
+ENTRY = struct.Struct('>QHHI')  # key, move, weight, learn (unused)
+MAX_WEIGHT = 0xFFFF
+
+# Points for the side that played a move, by game result
+RESULT_POINTS = {'1-0': {'white': 2, 'black': 0}, '0-1': {'white': 0, 'black': 2},
+                 '1/2-1/2': {'white': 1, 'black': 1}}
+
+
+class OpeningBook:
+    """Read-only, memory-mapped opening book"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        size = self._file.seek(0, 2)
+        self.entry_count = size // ENTRY.size
+        # mmap cannot map an empty file
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._map:
+            self._map.close()
+        self._file.close()
+
+    def _key_at(self, index):
+        return ENTRY.unpack_from(self._map, index * ENTRY.size)[0]
+
+    def probe(self, key):
+        """[(move, weight)] stored for a position hash, heaviest first"""
+        low, high = 0, self.entry_count
+        while low < high:  # First entry with a key >= key
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        for index in range(low, self.entry_count):
+            entry_key, move_code, weight, _ = ENTRY.unpack_from(self._map, index * ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append((decode_move(move_code), weight))
+        return entries
+
+    def choose_move(self, position, rng=random):
+        """A legal book move picked at random by weight, or None when out of book"""
+        legal = position.legal_moves()
+        entries = [(move, weight) for move, weight in self.probe(position.hash_key) if move in legal and weight]
+        if not entries:
+            return None
+        return rng.choices([move for move, _ in entries], [weight for _, weight in entries])[0]
+
+
+def collect_book_moves(games, max_plies=16):
+    """{(key, move code): points} over the first max_plies of each game; stops a game at a bad move"""
+    points = {}
+    for game in games:
+        result_points = RESULT_POINTS.get(game.result)
+        try:
+            position = Position.from_fen(game.headers.get('FEN', START_FEN))
+        except ValueError:
+            continue
+        for san in game.moves[:max_plies]:
+            try:
+                move = move_from_san(position, san)
+            except ValueError:
+                break
+            key = (position.hash_key, encode_move(move))
+            # A game without a result still counts as one appearance
+            gained = result_points[position.current_turn] if result_points else 1
+            entry = points.setdefault(key, [0, 0])
+            entry[0] += gained
+            entry[1] += 1
+            position.make_move(move)
+    return points
+
+
+def write_book(path, points, min_games=1):
+    """Write collected moves as a sorted book, dropping moves seen in fewer than min_games games"""
+    entries = [(key, move_code, max(score, 1)) for (key, move_code), (score, games) in points.items()
+               if games >= min_games]
+    top = max((weight for _, _, weight in entries), default=1)
+    scale = min(1.0, MAX_WEIGHT / top)  # Keep relative weights inside 16 bits
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    with open(path, 'wb') as book:
+        for key, move_code, weight in entries:
+            book.write(ENTRY.pack(key, move_code, max(1, int(weight * scale)), 0))
+    return len(entries)
+
+
+def build_command(args):
+    """Build a book file from a PGN file"""
+    with open(args.pgn, encoding='utf-8', errors='replace') as stream:
+        points = collect_book_moves(read_games(stream), args.plies)
+    entries = write_book(args.book, points, args.min_games)
+    return {'command': 'build', 'book': args.book, 'entries': entries, 'moves_seen': len(points)}
+
+
+def probe_command(args):
+    """List the book moves of one position"""
+    position = Position.from_fen(args.fen)
+    with OpeningBook(args.book) as book:
+        entries = book.probe(position.hash_key)
+    return {'command': 'probe', 'fen': args.fen,
+            'moves': [{'move': move_to_uci(move), 'weight': weight} for move, weight in entries]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='create a book from PGN games')
+    build_parser.add_argument('pgn', help='PGN file to read games from')
+    build_parser.add_argument('book', help='book file to write')
+    build_parser.add_argument('--plies', type=int, default=16, help='moves per game to take into the book')
+    build_parser.add_argument('--min-games', type=int, default=1, help='drop moves played in fewer games')
+
+    probe_parser = commands.add_parser('probe', help='list the book moves of a position')
+    probe_parser.add_argument('book', help='book file to read')
+    probe_parser.add_argument('--fen', default=START_FEN, help='position to look up (default: the start position)')
+
+    args = parser.parse_args(argv)
+    report = build_command(args) if args.command == 'build' else probe_command(args)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
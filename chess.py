@@ -1,13 +1,19 @@
+import argparse
+import sys
+
 import pygame
 
-# Initialize Pygame
-pygame.init()
+import ai
+import instrument
+from ai import (DEFAULT_BOOK_PATH, DEFAULT_LEVEL, DEFAULT_TABLEBASE_DIRECTORY, LEVELS, AIMoveTask, make_searcher,
+                open_book, open_tablebases, predict_reply)
+from engine import BOARD_SIZE, new_game
+from parallel import ParallelSearcher
 
 # Screen dimensions
 screen_width = 800
 screen_height = 600
-screen = pygame.display.set_mode((screen_width, screen_height))
-pygame.display.set_caption("Chess Board")
+screen = None  # Created by main() so importing this module opens no window
 
 # Colors
 WHITE = (255, 255, 255)
@@ -16,9 +22,13 @@ GREEN = (0, 255, 0)  # Valid move highlight
 RED = (255, 0, 0)    # Blocked move highlight
 PURPLE = (128, 0, 128)  # Capture move highlight
 HIGHLIGHT_ALPHA = 128  # Semi-transparent highlight
+FPS = 30  # Frame cap while the AI thinks; otherwise the loop sleeps until an event
+AI_MIN_THINK_MS = 500  # Hold fast AI moves back a little for better UX
+BACKGROUND = (50, 50, 50)
+PROFILE_KEY = pygame.K_F3  # Toggles the instrumentation overlay when run with --profile
 
 # Chess board parameters
-board_size = 8  # 8x8 chess board
+board_size = BOARD_SIZE  # 8x8 chess board
 tile_size = min(screen_width, screen_height) // 10  # Calculate tile size based on screen
 board_pixel_size = tile_size * board_size  # Total board size in pixels
 
@@ -26,383 +36,129 @@ board_pixel_size = tile_size * board_size  # Total board size in pixels
 board_x = (screen_width - board_pixel_size) // 2
 board_y = (screen_height - board_pixel_size) // 2
 
-# Initialize all pieces
-pieces = []  # Changed from pawns to pieces to hold all piece types
+# Game state; all rules live in the engine's Position
+position = new_game()
 selected_piece = None  # Currently selected piece
 valid_moves = []       # List of (row, col) tuples for valid moves
 blocked_moves = []     # List of (row, col) tuples for blocked moves
 capture_moves = []     # List of (row, col) tuples for capture moves
 
-# Base Piece class
-class Piece:
-    def __init__(self, color, row, col, piece_type):
-        self.color = color  # 'white' or 'black'
-        self.row = row
-        self.col = col
-        self.piece_type = piece_type  # 'pawn', 'rook', 'knight', 'bishop', 'queen', 'king'
-        self.has_moved = False
-    
-    def draw(self, screen, x, y, size):
-        center_x = x + size // 2
-        center_y = y + size // 2
-        
-        # Determine piece color and outline color
-        if self.color == 'white':
-            piece_color = WHITE
-            outline_color = BLACK
-        else:
-            piece_color = BLACK
-            outline_color = WHITE
-        
-        # Draw different shapes for different pieces
-        if self.piece_type == 'pawn':
-            radius = size // 3
-            pygame.draw.circle(screen, piece_color, (center_x, center_y), radius)
-            pygame.draw.circle(screen, outline_color, (center_x, center_y), radius, 2)
-        elif self.piece_type == 'rook':
-            # Draw a rectangle
-            rect_size = size // 2
-            pygame.draw.rect(screen, piece_color, (center_x - rect_size//2, center_y - rect_size//2, rect_size, rect_size))
-            pygame.draw.rect(screen, outline_color, (center_x - rect_size//2, center_y - rect_size//2, rect_size, rect_size), 2)
-        elif self.piece_type == 'knight':
-            # Draw a triangle
-            points = [(center_x, center_y - size//3), (center_x - size//3, center_y + size//3), (center_x + size//3, center_y + size//3)]
-            pygame.draw.polygon(screen, piece_color, points)
-            pygame.draw.polygon(screen, outline_color, points, 2)
-        elif self.piece_type == 'bishop':
-            # Draw a diamond
-            points = [(center_x, center_y - size//3), (center_x + size//3, center_y), (center_x, center_y + size//3), (center_x - size//3, center_y)]
-            pygame.draw.polygon(screen, piece_color, points)
-            pygame.draw.polygon(screen, outline_color, points, 2)
-        elif self.piece_type == 'queen':
-            # Draw a circle with a smaller circle on top
-            radius = size // 3
-            pygame.draw.circle(screen, piece_color, (center_x, center_y), radius)
-            pygame.draw.circle(screen, outline_color, (center_x, center_y), radius, 2)
-            # Crown
-            small_radius = size // 6
-            pygame.draw.circle(screen, piece_color, (center_x, center_y - size//4), small_radius)
-            pygame.draw.circle(screen, outline_color, (center_x, center_y - size//4), small_radius, 2)
-        elif self.piece_type == 'king':
-            # Draw a circle with a cross on top
-            radius = size // 3
-            pygame.draw.circle(screen, piece_color, (center_x, center_y), radius)
-            pygame.draw.circle(screen, outline_color, (center_x, center_y), radius, 2)
-            # Cross
-            cross_size = size // 4
-            pygame.draw.line(screen, outline_color, (center_x, center_y - radius), (center_x, center_y - radius - cross_size), 2)
-            pygame.draw.line(screen, outline_color, (center_x - cross_size//2, center_y - radius - cross_size//2), (center_x + cross_size//2, center_y - radius - cross_size//2), 2)
-
-def get_piece_at(row, col):
-    """Get the piece at a specific board position"""
-    for piece in pieces:
-        if piece.row == row and piece.col == col:
-            return piece
-    return None
-
-def is_valid_board_position(row, col):
-    """Check if a position is within board boundaries"""
-    return 0 <= row < board_size and 0 <= col < board_size
-
-def get_pawn_moves(piece):
-    """Calculate all possible moves for a pawn"""
-    moves = []
-    direction = -1 if piece.color == 'white' else 1
-    
-    # Move 1 square forward
-    new_row = piece.row + direction
-    if is_valid_board_position(new_row, piece.col):
-        moves.append((new_row, piece.col))
-    
-    # Move 2 squares forward on first move
-    if not piece.has_moved:
-        new_row = piece.row + (2 * direction)
-        if is_valid_board_position(new_row, piece.col):
-            moves.append((new_row, piece.col))
-    
-    return moves
-
-def get_pawn_capture_moves(piece):
-    """Calculate capture moves for a pawn (diagonal)"""
-    moves = []
-    direction = -1 if piece.color == 'white' else 1
-    
-    for col_offset in [-1, 1]:
-        new_row = piece.row + direction
-        new_col = piece.col + col_offset
-        if is_valid_board_position(new_row, new_col):
-            moves.append((new_row, new_col))
-    
-    return moves
-
-def get_rook_moves(piece):
-    """Calculate all possible moves for a rook (horizontal and vertical)"""
-    moves = []
-    # Horizontal moves
-    for col_offset in [-1, 1]:
-        for i in range(1, board_size):
-            new_col = piece.col + (col_offset * i)
-            if not is_valid_board_position(piece.row, new_col):
-                break
-            moves.append((piece.row, new_col))
-            if get_piece_at(piece.row, new_col) is not None:
-                break
-    
-    # Vertical moves
-    for row_offset in [-1, 1]:
-        for i in range(1, board_size):
-            new_row = piece.row + (row_offset * i)
-            if not is_valid_board_position(new_row, piece.col):
-                break
-            moves.append((new_row, piece.col))
-            if get_piece_at(new_row, piece.col) is not None:
-                break
-    
-    return moves
-
-def get_knight_moves(piece):
-    """Calculate all possible moves for a knight (L-shaped)"""
-    moves = []
-    knight_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
-    
-    for row_offset, col_offset in knight_moves:
-        new_row = piece.row + row_offset
-        new_col = piece.col + col_offset
-        if is_valid_board_position(new_row, new_col):
-            moves.append((new_row, new_col))
-    
-    return moves
-
-def get_bishop_moves(piece):
-    """Calculate all possible moves for a bishop (diagonal)"""
-    moves = []
-    directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-    
-    for row_offset, col_offset in directions:
-        for i in range(1, board_size):
-            new_row = piece.row + (row_offset * i)
-            new_col = piece.col + (col_offset * i)
-            if not is_valid_board_position(new_row, new_col):
-                break
-            moves.append((new_row, new_col))
-            if get_piece_at(new_row, new_col) is not None:
-                break
-    
-    return moves
-
-def get_queen_moves(piece):
-    """Calculate all possible moves for a queen (rook + bishop)"""
-    moves = []
-    moves.extend(get_rook_moves(piece))
-    moves.extend(get_bishop_moves(piece))
-    return moves
-
-def get_king_moves(piece):
-    """Calculate all possible moves for a king (one square in any direction)"""
-    moves = []
-    directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-    
-    for row_offset, col_offset in directions:
-        new_row = piece.row + row_offset
-        new_col = piece.col + col_offset
-        if is_valid_board_position(new_row, new_col):
-            target_piece = get_piece_at(new_row, new_col)
-            if target_piece is None or target_piece.color != piece.color:
-                moves.append((new_row, new_col))
-    
-    return moves
-
-def get_king_position(color):
-    """Find the position of the king of the given color"""
-    for piece in pieces:
-        if piece.piece_type == 'king' and piece.color == color:
-            return piece.row, piece.col
-    return None
-
-def is_square_under_attack(row, col, attacking_color):
-    """Check if a square is under attack by any piece of the attacking color (Optimized)"""
-    
-    # Directions for straight line attacks (Rook, Queen)
-    straight_directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-    for d_row, d_col in straight_directions:
-        for i in range(1, board_size):
-            check_row, check_col = row + d_row * i, col + d_col * i
-            if not is_valid_board_position(check_row, check_col):
-                break
-            piece = get_piece_at(check_row, check_col)
-            if piece:
-                if piece.color == attacking_color and (piece.piece_type == 'rook' or piece.piece_type == 'queen'):
-                    return True
-                break # Blocked by any piece
-
-    # Directions for diagonal attacks (Bishop, Queen)
-    diagonal_directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-    for d_row, d_col in diagonal_directions:
-        for i in range(1, board_size):
-            check_row, check_col = row + d_row * i, col + d_col * i
-            if not is_valid_board_position(check_row, check_col):
-                break
-            piece = get_piece_at(check_row, check_col)
-            if piece:
-                if piece.color == attacking_color and (piece.piece_type == 'bishop' or piece.piece_type == 'queen'):
-                    return True
-                break # Blocked by any piece
-
-    # Knight attacks
-    knight_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
-    for d_row, d_col in knight_moves:
-        check_row, check_col = row + d_row, col + d_col
-        if is_valid_board_position(check_row, check_col):
-            piece = get_piece_at(check_row, check_col)
-            if piece and piece.color == attacking_color and piece.piece_type == 'knight':
-                return True
-
-    # Pawn attacks
-    # If attacking color is white, they attack from row+1 (since they move -1)
-    # If attacking color is black, they attack from row-1 (since they move +1)
-    pawn_row_offset = 1 if attacking_color == 'white' else -1
-    for col_offset in [-1, 1]:
-        check_row, check_col = row + pawn_row_offset, col + col_offset
-        if is_valid_board_position(check_row, check_col):
-            piece = get_piece_at(check_row, check_col)
-            if piece and piece.color == attacking_color and piece.piece_type == 'pawn':
-                return True
-
-    # King attacks (adjacent squares)
-    king_moves = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-    for d_row, d_col in king_moves:
-        check_row, check_col = row + d_row, col + d_col
-        if is_valid_board_position(check_row, check_col):
-            piece = get_piece_at(check_row, check_col)
-            if piece and piece.color == attacking_color and piece.piece_type == 'king':
-                return True
-
-    return False
-
-def is_in_check(color):
-    """Check if the king of the given color is in check"""
-    king_pos = get_king_position(color)
-    if king_pos is None:
-        return False # King not on board (shouldn't happen in normal play)
-    
-    attacking_color = 'black' if color == 'white' else 'white'
-    return is_square_under_attack(king_pos[0], king_pos[1], attacking_color)
-
-def simulate_move(piece, move_row, move_col):
-    """Simulate a move to check if it results in check for the current player"""
-    original_row, original_col = piece.row, piece.col
-    
-    # Store state of captured piece
-    captured_piece = get_piece_at(move_row, move_col)
-    if captured_piece:
-        pieces.remove(captured_piece)
-    
-    # Make the move
-    piece.row = move_row
-    piece.col = move_col
-    
-    # Check if king is in check after the move
-    in_check = is_in_check(piece.color)
-    
-    # Undo the move
-    piece.row = original_row
-    piece.col = original_col
-    if captured_piece:
-        pieces.append(captured_piece)
-        
-    return in_check
+game_state = 'MENU' # 'MENU', 'PLAYING', 'GAME_OVER'
+player_color = None # 'white' or 'black'
+ai_color = None
+ai_level = DEFAULT_LEVEL # Key of ai.LEVELS
+ai_searcher = None # Kept across moves so the search table carries over
+ai_book = None # OpeningBook the AI plays from while in book
+ai_tablebases = None # Tablebases for endgame moves and dead draws
+ai_task = None # AIMoveTask while the AI is thinking
+ai_task_started = 0 # pygame ticks when ai_task started
+ai_ponder = None # AIMoveTask searching the player's predicted reply while they think
+ai_ponder_started = 0 # pygame ticks when ai_ponder started
+winner = None # 'white', 'black', or 'draw'
 
-def check_moves(piece):
-    """Check all possible moves and categorize them as valid, blocked, or capture"""
-    global valid_moves, blocked_moves, capture_moves
-    valid_moves = []
-    blocked_moves = []
-    capture_moves = []
-    
-    # Get possible moves based on piece type
-    if piece.piece_type == 'pawn':
-        # Pawn forward moves
-        possible_forward_moves = get_pawn_moves(piece)
-        for move_row, move_col in possible_forward_moves:
-            if not simulate_move(piece, move_row, move_col):
-                valid_moves.append((move_row, move_col))
-            else:
-                blocked_moves.append((move_row, move_col))
-        
-        # Check capture moves for pawn
-        capture_positions = get_pawn_capture_moves(piece)
-        for move_row, move_col in capture_positions:
-            piece_at_dest = get_piece_at(move_row, move_col)
-            if piece_at_dest is not None and piece_at_dest.color != piece.color:
-                if not simulate_move(piece, move_row, move_col):
-                    capture_moves.append((move_row, move_col))
-            else:
-                # If there's no piece or it's own piece, it's not a valid capture
-                # but we might still want to mark it as blocked if it's a potential attack square
-                # For now, we only add to capture_moves if it's a valid capture.
-                # If it's an empty square, it's not a valid pawn move or capture.
-                # If it's own piece, it's blocked.
-                if piece_at_dest is not None and piece_at_dest.color == piece.color:
-                    blocked_moves.append((move_row, move_col))
-    
+# Rendering caches
+board_backgrounds = {} # Orientation (player color) -> pre-rendered checkerboard Surface
+drawn_screen = None # (game_state, player_color) on screen now; None forces a full redraw
+drawn_squares = {} # (row, col) -> what was last drawn there while PLAYING
+piece_sprites = {} # (piece_type, color, tile_size) -> pre-rendered piece Surface
+highlight_surfaces = {} # (color, tile_size) -> semi-transparent tile Surface
+sprite_tile_size = None # Tile size the sprite caches were built for
+fonts = {} # Font size -> pygame Font
+text_surfaces = {} # (text, font size, color) -> rendered text Surface
+show_profile = False # Instrumentation overlay on (only with --profile)
+
+def check_sprite_tile_size(size):
+    """Drop the sprite caches when the tile size changes"""
+    global sprite_tile_size
+    if size != sprite_tile_size:
+        piece_sprites.clear()
+        highlight_surfaces.clear()
+        sprite_tile_size = size
+
+def get_piece_sprite(piece_type, color, size):
+    """A piece drawn once onto a transparent tile-sized Surface"""
+    check_sprite_tile_size(size)
+    key = (piece_type, color, size)
+    sprite = piece_sprites.get(key)
+    if sprite is None:
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+        draw_piece_shape(sprite, piece_type, color, size)
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha() # Match the screen's pixel format for fast blits
+        piece_sprites[key] = sprite
+    return sprite
+
+def get_font(size):
+    """The default font at a size, loaded once"""
+    font = fonts.get(size)
+    if font is None:
+        font = fonts[size] = pygame.font.SysFont(None, size)
+    return font
+
+def get_text(text, size, color):
+    """Text rendered once in the default font"""
+    key = (text, size, color)
+    surface = text_surfaces.get(key)
+    if surface is None:
+        surface = text_surfaces[key] = get_font(size).render(text, True, color)
+    return surface
+
+def draw_piece(screen, piece, x, y, size):
+    """Draw a piece inside the tile at (x, y)"""
+    screen.blit(get_piece_sprite(piece.piece_type, piece.color, size), (x, y))
+
+def draw_piece_shape(screen, piece_type, color, size):
+    """Draw a piece as a simple shape inside a tile at the surface's top-left corner"""
+    center_x = size // 2
+    center_y = size // 2
+    
+    # Determine piece color and outline color
+    if color == 'white':
+        piece_color = WHITE
+        outline_color = BLACK
     else:
-        # For other pieces, get their moves
-        if piece.piece_type == 'rook':
-            possible_moves = get_rook_moves(piece)
-        elif piece.piece_type == 'knight':
-            possible_moves = get_knight_moves(piece)
-        elif piece.piece_type == 'bishop':
-            possible_moves = get_bishop_moves(piece)
-        elif piece.piece_type == 'queen':
-            possible_moves = get_queen_moves(piece)
-        elif piece.piece_type == 'king':
-            possible_moves = get_king_moves(piece)
-        else:
-            possible_moves = []
-        
-        for move_row, move_col in possible_moves:
-            if not is_valid_board_position(move_row, move_col):
-                # This case should ideally be handled by the get_*_moves functions
-                # but as a safeguard, mark as blocked.
-                blocked_moves.append((move_row, move_col))
-                continue
-            
-            piece_at_dest = get_piece_at(move_row, move_col)
-            if piece_at_dest is None:
-                if not simulate_move(piece, move_row, move_col):
-                    valid_moves.append((move_row, move_col))
-                else:
-                    blocked_moves.append((move_row, move_col))
-            elif piece_at_dest.color != piece.color:
-                if not simulate_move(piece, move_row, move_col):
-                    capture_moves.append((move_row, move_col))
-                else:
-                    blocked_moves.append((move_row, move_col))
-            else:
-                blocked_moves.append((move_row, move_col))
-
-def has_legal_moves(color):
-    """Check if the player has any legal moves"""
-    global valid_moves, blocked_moves, capture_moves
-    for piece in pieces:
-        if piece.color == color:
-            # Temporarily store current global move lists
-            temp_valid_moves = list(valid_moves)
-            temp_blocked_moves = list(blocked_moves)
-            temp_capture_moves = list(capture_moves)
-
-            check_moves(piece)
-            
-            # Restore global move lists
-            current_piece_valid_moves = list(valid_moves)
-            current_piece_capture_moves = list(capture_moves)
-            valid_moves = temp_valid_moves
-            blocked_moves = temp_blocked_moves
-            capture_moves = temp_capture_moves
+        piece_color = BLACK
+        outline_color = WHITE
+    
+    # Draw different shapes for different pieces
+    if piece_type == 'pawn':
+        radius = size // 3
+        pygame.draw.circle(screen, piece_color, (center_x, center_y), radius)
+        pygame.draw.circle(screen, outline_color, (center_x, center_y), radius, 2)
+    elif piece_type == 'rook':
+        # Draw a rectangle
+        rect_size = size // 2
+        pygame.draw.rect(screen, piece_color, (center_x - rect_size//2, center_y - rect_size//2, rect_size, rect_size))
+        pygame.draw.rect(screen, outline_color, (center_x - rect_size//2, center_y - rect_size//2, rect_size, rect_size), 2)
+    elif piece_type == 'knight':
+        # Draw a triangle
+        points = [(center_x, center_y - size//3), (center_x - size//3, center_y + size//3), (center_x + size//3, center_y + size//3)]
+        pygame.draw.polygon(screen, piece_color, points)
+        pygame.draw.polygon(screen, outline_color, points, 2)
+    elif piece_type == 'bishop':
+        # Draw a diamond
+        points = [(center_x, center_y - size//3), (center_x + size//3, center_y), (center_x, center_y + size//3), (center_x - size//3, center_y)]
+        pygame.draw.polygon(screen, piece_color, points)
+        pygame.draw.polygon(screen, outline_color, points, 2)
+    elif piece_type == 'queen':
+        # Draw a circle with a smaller circle on top
+        radius = size // 3
+        pygame.draw.circle(screen, piece_color, (center_x, center_y), radius)
+        pygame.draw.circle(screen, outline_color, (center_x, center_y), radius, 2)
+        # Crown
+        small_radius = size // 6
+        pygame.draw.circle(screen, piece_color, (center_x, center_y - size//4), small_radius)
+        pygame.draw.circle(screen, outline_color, (center_x, center_y - size//4), small_radius, 2)
+    elif piece_type == 'king':
+        # Draw a circle with a cross on top
+        radius = size // 3
+        pygame.draw.circle(screen, piece_color, (center_x, center_y), radius)
+        pygame.draw.circle(screen, outline_color, (center_x, center_y), radius, 2)
+        # Cross
+        cross_size = size // 7 # Keeps the cross inside the tile, which is redrawn on its own
+        pygame.draw.line(screen, outline_color, (center_x, center_y - radius), (center_x, center_y - radius - cross_size), 2)
+        pygame.draw.line(screen, outline_color, (center_x - cross_size//2, center_y - radius - cross_size//2), (center_x + cross_size//2, center_y - radius - cross_size//2), 2)
 
-            if current_piece_valid_moves or current_piece_capture_moves:
-                return True
-    return False
 
 def get_visual_coords(row, col):
     """Transform logical coordinates to visual coordinates based on player color"""
@@ -422,121 +178,74 @@ def get_board_position_from_mouse(mouse_x, mouse_y):
         return row, col
     return None, None
 
-def move_piece(piece, new_row, new_col):
-    """Move a piece to a new position"""
-    piece.row = new_row
-    piece.col = new_col
-    if not piece.has_moved:
-        piece.has_moved = True
+def clear_selection():
+    """Forget the selected piece and its highlighted moves"""
+    global selected_piece, valid_moves, blocked_moves, capture_moves
+    selected_piece = None
+    valid_moves = []
+    blocked_moves = []
+    capture_moves = []
 
 def handle_piece_selection(mouse_x, mouse_y):
     """Handle clicking on a piece to select it, or moving to a valid square"""
-    global selected_piece, valid_moves, blocked_moves, capture_moves, current_turn, game_state, winner
+    global selected_piece, valid_moves, blocked_moves, capture_moves
     
     # Only allow interaction if it's the player's turn
-    if current_turn != player_color:
+    if position.current_turn != player_color:
         return
 
     row, col = get_board_position_from_mouse(mouse_x, mouse_y)
     
     if row is not None and col is not None:
         if selected_piece is not None:
-            if (row, col) in valid_moves:
-                move_piece(selected_piece, row, col)
-                selected_piece = None
-                valid_moves = []
-                blocked_moves = []
-                capture_moves = []
-                current_turn = 'white' if current_turn == 'black' else 'black'
-                check_game_over()
-                return
-            elif (row, col) in capture_moves:
-                captured_piece = get_piece_at(row, col)
-                if captured_piece is not None:
-                    pieces.remove(captured_piece)
-                move_piece(selected_piece, row, col)
-                selected_piece = None
-                valid_moves = []
-                blocked_moves = []
-                capture_moves = []
-                current_turn = 'white' if current_turn == 'black' else 'black'
+            if (row, col) in valid_moves or (row, col) in capture_moves:
+                # Pawns reaching the last row always promote to a queen
+                promotion = None
+                if selected_piece.piece_type == 'pawn' and row in (0, board_size - 1):
+                    promotion = 'queen'
+                position.make_move((selected_piece.row, selected_piece.col, row, col, promotion))
+                clear_selection()
                 check_game_over()
+                resolve_ponder()
                 return
         
-        piece = get_piece_at(row, col)
+        piece = position.get_piece_at(row, col)
         if piece is not None:
             # Only allow selecting own pieces
             if piece.color == player_color:
                 selected_piece = piece
-                check_moves(selected_piece)
+                valid_moves, blocked_moves, capture_moves = position.check_moves(selected_piece)
         else:
-            selected_piece = None
-            valid_moves = []
-            blocked_moves = []
-            capture_moves = []
-
-def draw_highlights(screen):
-    """Draw green highlights for valid moves, red for blocked moves, and purple for capture moves"""
-    for row, col in valid_moves:
-        vis_row, vis_col = get_visual_coords(row, col)
-        x = board_x + vis_col * tile_size
-        y = board_y + vis_row * tile_size
-        highlight = pygame.Surface((tile_size, tile_size))
-        highlight.set_alpha(HIGHLIGHT_ALPHA)
-        highlight.fill(GREEN)
-        screen.blit(highlight, (x, y))
-    
-    for row, col in blocked_moves:
-        vis_row, vis_col = get_visual_coords(row, col)
-        x = board_x + vis_col * tile_size
-        y = board_y + vis_row * tile_size
-        highlight = pygame.Surface((tile_size, tile_size))
-        highlight.set_alpha(HIGHLIGHT_ALPHA)
-        highlight.fill(RED)
-        screen.blit(highlight, (x, y))
-    
-    for row, col in capture_moves:
-        vis_row, vis_col = get_visual_coords(row, col)
-        x = board_x + vis_col * tile_size
-        y = board_y + vis_row * tile_size
-        highlight = pygame.Surface((tile_size, tile_size))
+            clear_selection()
+
+def get_highlights():
+    """Map highlighted squares to their color: green for valid moves, red for blocked moves, purple for captures"""
+    highlights = {}
+    for moves, color in ((valid_moves, GREEN), (blocked_moves, RED), (capture_moves, PURPLE)):
+        for square in moves:
+            highlights[square] = color
+    return highlights
+
+def get_highlight_surface(color, size):
+    """A semi-transparent tile of one color, built once"""
+    check_sprite_tile_size(size)
+    key = (color, size)
+    highlight = highlight_surfaces.get(key)
+    if highlight is None:
+        highlight = pygame.Surface((size, size))
         highlight.set_alpha(HIGHLIGHT_ALPHA)
-        highlight.fill(PURPLE)
-        screen.blit(highlight, (x, y))
+        highlight.fill(color)
+        highlight_surfaces[key] = highlight
+    return highlight
+
+def draw_highlight(screen, x, y, color):
+    """Shade the tile at (x, y) with a semi-transparent color"""
+    screen.blit(get_highlight_surface(color, tile_size), (x, y))
 
 def setupBoard():
     """Setup the board with all pieces in starting positions"""
-    pieces.clear()
-    
-    # White pieces (bottom, rows 6-7)
-    # Pawns (row 6)
-    for col in range(8):
-        pieces.append(Piece('white', 6, col, 'pawn'))
-    
-    # Back row (row 7)
-    pieces.append(Piece('white', 7, 0, 'rook'))
-    pieces.append(Piece('white', 7, 1, 'knight'))
-    pieces.append(Piece('white', 7, 2, 'bishop'))
-    pieces.append(Piece('white', 7, 3, 'queen'))
-    pieces.append(Piece('white', 7, 4, 'king'))
-    pieces.append(Piece('white', 7, 5, 'bishop'))
-    pieces.append(Piece('white', 7, 6, 'knight'))
-    pieces.append(Piece('white', 7, 7, 'rook'))
-    
-    # Black pieces (top, rows 0-1)
-    # Pawns (row 1)
-    for col in range(8):
-        pieces.append(Piece('black', 1, col, 'pawn'))
-    
-    # Back row (row 0)
-    pieces.append(Piece('black', 0, 0, 'rook'))
-    pieces.append(Piece('black', 0, 1, 'knight'))
-    pieces.append(Piece('black', 0, 2, 'bishop'))
-    pieces.append(Piece('black', 0, 3, 'queen'))
-    pieces.append(Piece('black', 0, 4, 'king'))
-    pieces.append(Piece('black', 0, 5, 'bishop'))
-    pieces.append(Piece('black', 0, 6, 'knight'))
-    pieces.append(Piece('black', 0, 7, 'rook'))
+    cancel_ai_move()
+    position.setup_board()
 
 def draw_all_pieces(screen, pieces_list, board_x, board_y, tile_size):
     """Draw all pieces on the board"""
@@ -544,101 +253,176 @@ def draw_all_pieces(screen, pieces_list, board_x, board_y, tile_size):
         vis_row, vis_col = get_visual_coords(piece.row, piece.col)
         x = board_x + vis_col * tile_size
         y = board_y + vis_row * tile_size
-        piece.draw(screen, x, y, tile_size)
-
-import random
-
-# ... (existing imports and init)
-
-# Game loop
-setupBoard()
-running = True
-game_state = 'MENU' # 'MENU', 'PLAYING', 'GAME_OVER'
-player_color = None # 'white' or 'black'
-ai_color = None
-current_turn = 'white'
-winner = None # 'white', 'black', or 'draw'
+        draw_piece(screen, piece, x, y, tile_size)
+
+def get_board_background():
+    """The checkerboard as seen by the player, rendered once per orientation"""
+    background = board_backgrounds.get(player_color)
+    if background is None:
+        background = pygame.Surface((board_pixel_size, board_pixel_size))
+        draw_tiles(background, 0, 0)
+        board_backgrounds[player_color] = background
+    return background
+
+def draw_board(screen):
+    """Draw the checkerboard from its cached Surface"""
+    screen.blit(get_board_background(), (board_x, board_y))
+
+def draw_tiles(surface, left, top):
+    """Draw the checkerboard tiles with the board's top-left corner at (left, top)"""
+    for row in range(board_size):
+        for col in range(board_size):
+            # Determine visual position
+            vis_row, vis_col = get_visual_coords(row, col)
+            
+            # Check color based on logical position (checkerboard pattern is consistent)
+            if (row + col) % 2 == 0:
+                tile_color = WHITE
+            else:
+                tile_color = BLACK
+            
+            # Draw at visual position
+            x = left + vis_col * tile_size
+            y = top + vis_row * tile_size
+            pygame.draw.rect(surface, tile_color, (x, y, tile_size, tile_size))
+
+def draw_playing_screen(screen, full_redraw):
+    """Draw the board in play, redrawing only squares that changed since the last frame.
+
+    Returns the screen rectangles that were drawn to.
+    """
+    global drawn_squares
+    dirty_rects = []
+    if full_redraw:
+        screen.fill(BACKGROUND)
+        draw_board(screen)
+        drawn_squares = {}
+        dirty_rects.append(screen.get_rect())
+    background = get_board_background()
+    highlights = get_highlights()
+    board = position.board
+    for row in range(board_size):
+        for col in range(board_size):
+            piece = board[row * board_size + col]
+            appearance = (piece and (piece.piece_type, piece.color), highlights.get((row, col)))
+            if drawn_squares.get((row, col)) == appearance:
+                continue
+            drawn_squares[(row, col)] = appearance
+            vis_row, vis_col = get_visual_coords(row, col)
+            tile = pygame.Rect(vis_col * tile_size, vis_row * tile_size, tile_size, tile_size)
+            x = board_x + tile.x
+            y = board_y + tile.y
+            screen.blit(background, (x, y), tile)
+            if appearance[1] is not None:
+                draw_highlight(screen, x, y, appearance[1])
+            if piece is not None:
+                draw_piece(screen, piece, x, y, tile_size)
+            dirty_rects.append(pygame.Rect(x, y, tile_size, tile_size))
+    return dirty_rects
+
+def draw_profile_overlay(screen):
+    """Draw the instrumentation numbers in the margin left of the board, returning the area drawn"""
+    panel = pygame.Rect(0, 0, board_x, screen_height)
+    screen.fill(BACKGROUND, panel)
+    report = instrument.report()
+    lines = [f"nodes {report['counters'].get('search_nodes', 0)}"]
+    for name, timing in report['timings'].items():
+        if timing['calls']:
+            lines.append(name)
+            lines.append(f"  {timing['calls']}x {format_micros(timing['mean_us'])} "
+                         f"p99<{format_micros(timing['p99_us'])}")
+    font = get_font(18) # Not get_text: these strings change every frame
+    screen.set_clip(panel) # The board is not redrawn under text that overflows
+    for number, line in enumerate(lines):
+        screen.blit(font.render(line, True, WHITE), (4, 4 + number * 16))
+    screen.set_clip(None)
+    return panel
+
+def format_micros(micros):
+    """A duration in microseconds, shown in ms once it is long"""
+    return f"{micros / 1000:.0f}ms" if micros >= 1000 else f"{micros:.0f}us"
 
 def draw_selection_screen(screen):
-    # ... (existing code)
-    screen.fill((50, 50, 50))
-    font = pygame.font.SysFont(None, 48)
-    
-    title_text = font.render("Choose Your Color", True, WHITE)
+    screen.fill(BACKGROUND)
+    title_text = get_text("Choose Your Color", 48, WHITE)
     screen.blit(title_text, (screen_width // 2 - title_text.get_width() // 2, screen_height // 4))
     
     # Draw White Button
     white_btn_rect = pygame.Rect(screen_width // 2 - 100, screen_height // 2 - 50, 200, 50)
     pygame.draw.rect(screen, WHITE, white_btn_rect)
-    white_text = font.render("White", True, BLACK)
+    white_text = get_text("White", 48, BLACK)
     screen.blit(white_text, (white_btn_rect.centerx - white_text.get_width() // 2, white_btn_rect.centery - white_text.get_height() // 2))
     
     # Draw Black Button
     black_btn_rect = pygame.Rect(screen_width // 2 - 100, screen_height // 2 + 50, 200, 50)
     pygame.draw.rect(screen, BLACK, black_btn_rect)
     pygame.draw.rect(screen, WHITE, black_btn_rect, 2) # Outline for visibility
-    black_text = font.render("Black", True, WHITE)
+    black_text = get_text("Black", 48, WHITE)
     screen.blit(black_text, (black_btn_rect.centerx - black_text.get_width() // 2, black_btn_rect.centery - black_text.get_height() // 2))
     
     return white_btn_rect, black_btn_rect
 
 def check_game_over():
-    """Check if the game is over (checkmate or stalemate)"""
+    """Check if the game is over (checkmate, stalemate, or no mate left on the board)"""
     global game_state, winner
     
-    if not has_legal_moves(current_turn):
-        if is_in_check(current_turn):
-            winner = 'white' if current_turn == 'black' else 'black'
-        else:
-            winner = 'draw' # Stalemate
+    result = position.game_result()
+    if result is None and ai_tablebases is not None and ai_tablebases.is_dead_draw(position):
+        result = 'draw'
+    if result is not None:
+        winner = result
         game_state = 'GAME_OVER'
 
-def make_ai_move(color):
-    """Make a random valid move for the AI"""
-    global current_turn, selected_piece, valid_moves, blocked_moves, capture_moves
-    
-    # Get all pieces for the AI
-    ai_pieces = [p for p in pieces if p.color == color]
-    possible_moves_for_ai = []
-    
-    for piece in ai_pieces:
-        # Temporarily set selected_piece to current AI piece to get its moves
-        selected_piece = piece
-        check_moves(piece)
-        
-        # Add valid moves
-        for move in valid_moves:
-            possible_moves_for_ai.append((piece, move, 'move'))
-        # Add capture moves
-        for move in capture_moves:
-            possible_moves_for_ai.append((piece, move, 'capture'))
-            
-    # Clear selected_piece and move lists after checking all AI pieces
-    selected_piece = None
-    valid_moves = []
-    blocked_moves = []
-    capture_moves = []
-
-    if possible_moves_for_ai:
-        # Prioritize captures (simple intelligence)
-        captures = [m for m in possible_moves_for_ai if m[2] == 'capture']
-        if captures:
-            piece_to_move, (row, col), move_type = random.choice(captures)
-        else:
-            piece_to_move, (row, col), move_type = random.choice(possible_moves_for_ai)
-            
-        if move_type == 'capture':
-            captured_piece = get_piece_at(row, col)
-            if captured_piece:
-                pieces.remove(captured_piece)
-        
-        move_piece(piece_to_move, row, col)
-        
-        # Switch turn
-        current_turn = 'white' if current_turn == 'black' else 'black'
+def update_ai_move(color):
+    """Start the AI thinking on its turn, and play its move once it is ready"""
+    global ai_task, ai_task_started
+    if ai_task is None:
+        if position.current_turn == color:
+            ai_task = AIMoveTask(position, ai_level, ai_searcher, ai_book, ai_tablebases)
+            ai_task_started = pygame.time.get_ticks()
+        return
+    if not ai_task.done() or pygame.time.get_ticks() - ai_task_started < AI_MIN_THINK_MS:
+        return
+    task, ai_task = ai_task, None
+    move = task.result()
+    if move is not None and task.hash_key == position.hash_key:
+        position.make_move(move)
         
         # Check for game over after AI move
         check_game_over()
+        start_ponder()
+
+def start_ponder():
+    """Let the AI think about the player's predicted reply on the player's time"""
+    global ai_ponder, ai_ponder_started
+    if ai_searcher is None or game_state != 'PLAYING':
+        return
+    move = predict_reply(position, ai_searcher, ai_book, ai_tablebases)
+    if move is not None:
+        ai_ponder = AIMoveTask(position, ai_level, ai_searcher, ai_book, ai_tablebases, ponder_move=move)
+        ai_ponder_started = pygame.time.get_ticks()
+
+def resolve_ponder():
+    """After the player's move: keep the ponder search if it guessed the move, else drop it"""
+    global ai_ponder, ai_task, ai_task_started
+    if ai_ponder is None:
+        return
+    task, ai_ponder = ai_ponder, None
+    if task.hash_key == position.hash_key and game_state == 'PLAYING':
+        ai_task = task # update_ai_move plays its move as soon as it is done
+        ai_task_started = ai_ponder_started # The player's thinking time counts toward AI_MIN_THINK_MS
+    else:
+        task.cancel()
+
+def cancel_ai_move():
+    """Stop the AI thinking and pondering and drop its move"""
+    global ai_task, ai_ponder
+    if ai_task is not None:
+        ai_task.cancel()
+        ai_task = None
+    if ai_ponder is not None:
+        ai_ponder.cancel()
+        ai_ponder = None
 
 def draw_game_over_screen(screen, winner):
     """Draw the game over screen"""
@@ -647,112 +431,146 @@ def draw_game_over_screen(screen, winner):
     overlay.fill(BLACK)
     screen.blit(overlay, (0, 0))
     
-    font = pygame.font.SysFont(None, 64)
     if winner == 'draw':
-        text = "Stalemate! It's a Draw"
+        if position.has_legal_moves(position.current_turn):
+            text = "Insufficient Material! It's a Draw"
+        else:
+            text = "Stalemate! It's a Draw"
         color = WHITE
     else:
         text = f"Checkmate! {winner.capitalize()} Wins"
         color = GREEN if winner == player_color else RED
         
-    text_surface = font.render(text, True, color)
+    text_surface = get_text(text, 64, color)
     screen.blit(text_surface, (screen_width // 2 - text_surface.get_width() // 2, screen_height // 2 - text_surface.get_height() // 2))
     
-    small_font = pygame.font.SysFont(None, 32)
-    restart_text = small_font.render("Press SPACE to Restart", True, WHITE)
+    restart_text = get_text("Press SPACE to Restart", 32, WHITE)
     screen.blit(restart_text, (screen_width // 2 - restart_text.get_width() // 2, screen_height // 2 + 50))
 
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 1:
-                mouse_x, mouse_y = event.pos
-                
-                if game_state == 'MENU':
-                    # Re-calculate rects to check collision (simple way)
-                    white_btn_rect = pygame.Rect(screen_width // 2 - 100, screen_height // 2 - 50, 200, 50)
-                    black_btn_rect = pygame.Rect(screen_width // 2 - 100, screen_height // 2 + 50, 200, 50)
+def next_events(clock):
+    """Wait for input: block while nothing changes by itself, else poll at the frame cap.
+
+    Nothing changes by itself unless the AI is thinking or the screen still needs drawing.
+    """
+    if ai_task is None and drawn_screen is not None:
+        return [pygame.event.wait()] + pygame.event.get()
+    clock.tick(FPS)
+    return pygame.event.get()
+
+def main(argv=None):
+    global screen, game_state, player_color, ai_color, winner, ai_level, ai_searcher, ai_book, ai_tablebases, drawn_screen
+    global show_profile
+
+    parser = argparse.ArgumentParser(description="Play chess against the computer")
+    parser.add_argument('--level', choices=list(LEVELS), default=DEFAULT_LEVEL, help="AI strength")
+    parser.add_argument('--workers', type=int, default=1, help="CPU cores the AI searches on")
+    parser.add_argument('--book', default=DEFAULT_BOOK_PATH, help="opening book file (built by book.py)")
+    parser.add_argument('--tablebases', default=DEFAULT_TABLEBASE_DIRECTORY,
+                        help="endgame table directory (built by tablebase.py)")
+    parser.add_argument('--table-megabytes', type=float,
+                        help="AI search table size (default: 16, or 64 with several workers)")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="count and time hot paths, write them here as JSON on exit (F3 shows them)")
+    args = parser.parse_args(argv)
+    if args.profile:
+        instrument.enable()
+        instrument.patch(sys.modules[__name__], 'draw_playing_screen', 'frame')
+        instrument.patch(ai, 'choose_ai_move', 'ai_move')
+    ai_level = args.level
+    ai_book = open_book(args.book)
+    ai_tablebases = open_tablebases(args.tablebases)
+    if LEVELS[ai_level] is not None:
+        ai_searcher = make_searcher(ai_level, workers=args.workers, tablebases=ai_tablebases,
+                                    table_megabytes=args.table_megabytes)
+
+    # Initialize Pygame
+    pygame.init()
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    pygame.display.set_caption("Chess Board")
+
+    setupBoard()
+    pygame.event.set_blocked(pygame.MOUSEMOTION) # Unused; it would only wake the loop
+    clock = pygame.time.Clock()
+    running = True
+    while running:
+        for event in next_events(clock):
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                drawn_screen = None # The window system lost our pixels
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1:
+                    mouse_x, mouse_y = event.pos
                     
-                    if white_btn_rect.collidepoint(mouse_x, mouse_y):
-                        player_color = 'white'
-                        ai_color = 'black'
-                        game_state = 'PLAYING'
-                    elif black_btn_rect.collidepoint(mouse_x, mouse_y):
-                        player_color = 'black'
-                        ai_color = 'white'
-                        game_state = 'PLAYING'
+                    if game_state == 'MENU':
+                        # Re-calculate rects to check collision (simple way)
+                        white_btn_rect = pygame.Rect(screen_width // 2 - 100, screen_height // 2 - 50, 200, 50)
+                        black_btn_rect = pygame.Rect(screen_width // 2 - 100, screen_height // 2 + 50, 200, 50)
+                        
+                        if white_btn_rect.collidepoint(mouse_x, mouse_y):
+                            player_color = 'white'
+                            ai_color = 'black'
+                            game_state = 'PLAYING'
+                        elif black_btn_rect.collidepoint(mouse_x, mouse_y):
+                            player_color = 'black'
+                            ai_color = 'white'
+                            game_state = 'PLAYING'
                     
-                    current_turn = 'white' # White always starts
-                
-                elif game_state == 'PLAYING':
-                    handle_piece_selection(mouse_x, mouse_y)
+                    elif game_state == 'PLAYING':
+                        handle_piece_selection(mouse_x, mouse_y)
+            
+            elif event.type == pygame.KEYDOWN:
+                if event.key == PROFILE_KEY and instrument.enabled:
+                    show_profile = not show_profile
+                    drawn_screen = None # Clear the overlay's margin when it goes away
+                elif game_state == 'GAME_OVER':
+                    if event.key == pygame.K_SPACE:
+                        setupBoard()
+                        game_state = 'MENU'
+                        winner = None
+                        clear_selection()
+
+        if game_state == 'PLAYING':
+            # AI Turn: the search runs on a thread, so keep drawing meanwhile
+            update_ai_move(ai_color)
+
+        # Menu and game over screens are static: draw them once. While
+        # playing, only squares that changed are drawn and pushed.
+        full_redraw = drawn_screen != (game_state, player_color)
+        drawn_screen = (game_state, player_color)
+        if game_state == 'MENU':
+            if full_redraw:
+                draw_selection_screen(screen)
+                pygame.display.flip()
         
-        elif event.type == pygame.KEYDOWN:
-            if game_state == 'GAME_OVER':
-                if event.key == pygame.K_SPACE:
-                    setupBoard()
-                    game_state = 'MENU'
-                    current_turn = 'white'
-                    winner = None
-                    selected_piece = None
-                    valid_moves = []
-                    blocked_moves = []
-                    capture_moves = []
-
-    if game_state == 'MENU':
-        draw_selection_screen(screen)
-    
-    elif game_state == 'PLAYING':
-        # AI Turn
-        if current_turn == ai_color:
-            pygame.time.wait(500) # Small delay for better UX
-            make_ai_move(ai_color)
-
-        screen.fill((50, 50, 50))
-
-        # Draw chess board
-        for row in range(board_size):
-            for col in range(board_size):
-                # Determine visual position
-                vis_row, vis_col = get_visual_coords(row, col)
-                
-                # Check color based on logical position (checkerboard pattern is consistent)
-                if (row + col) % 2 == 0:
-                    tile_color = WHITE
-                else:
-                    tile_color = BLACK
-                
-                # Draw at visual position
-                x = board_x + vis_col * tile_size
-                y = board_y + vis_row * tile_size
-                pygame.draw.rect(screen, tile_color, (x, y, tile_size, tile_size))
-
-        # Draw highlights
-        if selected_piece is not None:
-            draw_highlights(screen)
-
-        # Draw all pieces
-        draw_all_pieces(screen, pieces, board_x, board_y, tile_size)
-    
-    elif game_state == 'GAME_OVER':
-        # Draw board in background
-        screen.fill((50, 50, 50))
-        for row in range(board_size):
-            for col in range(board_size):
-                vis_row, vis_col = get_visual_coords(row, col)
-                if (row + col) % 2 == 0:
-                    tile_color = WHITE
-                else:
-                    tile_color = BLACK
-                x = board_x + vis_col * tile_size
-                y = board_y + vis_row * tile_size
-                pygame.draw.rect(screen, tile_color, (x, y, tile_size, tile_size))
-        draw_all_pieces(screen, pieces, board_x, board_y, tile_size)
+        elif game_state == 'PLAYING':
+            dirty_rects = draw_playing_screen(screen, full_redraw)
+            if show_profile:
+                dirty_rects.append(draw_profile_overlay(screen))
+            if dirty_rects:
+                pygame.display.update(dirty_rects)
         
-        draw_game_over_screen(screen, winner)
-
-    pygame.display.flip()
-
-pygame.quit()
\ No newline at end of file
+        elif game_state == 'GAME_OVER':
+            if full_redraw:
+                # Draw board in background
+                screen.fill(BACKGROUND)
+                draw_board(screen)
+                draw_all_pieces(screen, position.pieces, board_x, board_y, tile_size)
+                
+                draw_game_over_screen(screen, winner)
+                pygame.display.flip()
+
+    cancel_ai_move()
+    pygame.quit()
+    if isinstance(ai_searcher, ParallelSearcher):
+        ai_searcher.close()
+    if ai_book is not None:
+        ai_book.close()
+    if ai_tablebases is not None:
+        ai_tablebases.close()
+    if args.profile:
+        instrument.disable()
+        instrument.dump(args.profile)
+
+if __name__ == '__main__':
+    main()
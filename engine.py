@@ -0,0 +1,1129 @@
+"""Headless chess rules engine.
+
+This module has no pygame dependency so positions can be created, searched
+and checked in batch jobs, tests and worker processes. The pygame front end
+in chess.py is a thin client of the Position class defined here.
+"""
+
+import copy
+import re
+
+from evaluation import ENDGAME_TABLES, MIDDLEGAME_TABLES, PHASE_WEIGHTS
+from zobrist import BLACK_TO_MOVE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS, PIECE_KEYS
+
+BOARD_SIZE = 8  # 8x8 chess board
+
+KNIGHT_OFFSETS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+KING_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+STRAIGHT_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+DIAGONAL_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+BACK_ROW = ['rook', 'knight', 'bishop', 'queen', 'king', 'bishop', 'knight', 'rook']
+PROMOTION_TYPES = ['queen', 'rook', 'bishop', 'knight']
+PIECE_LETTERS = {'pawn': 'p', 'knight': 'n', 'bishop': 'b', 'rook': 'r', 'queen': 'q', 'king': 'k'}
+LETTER_PIECES = {letter: piece_type for piece_type, letter in PIECE_LETTERS.items()}
+FILES = 'abcdefgh'
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# Castling rights are bit flags in Position.castling_rights
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+CASTLING_LETTERS = [('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE), ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE)]
+
+# Per color: (right, king target col, columns that must be empty, columns the king passes)
+CASTLING_MOVES = {
+    'white': [(WHITE_KINGSIDE, 6, (5, 6), (5, 6)), (WHITE_QUEENSIDE, 2, (1, 2, 3), (3, 2))],
+    'black': [(BLACK_KINGSIDE, 6, (5, 6), (5, 6)), (BLACK_QUEENSIDE, 2, (1, 2, 3), (3, 2))],
+}
+# King target col -> (rook from col, rook to col)
+CASTLING_ROOK_COLS = {6: (7, 5), 2: (0, 3)}
+
+# Standard algebraic notation: piece, from file, from rank, capture, target, promotion
+SAN_PATTERN = re.compile(r'([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQ]))?')
+
+
+def opposite_color(color):
+    """Return the other side's color"""
+    return 'black' if color == 'white' else 'white'
+
+
+def is_valid_board_position(row, col):
+    """Check if a position is within board boundaries"""
+    return 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE
+
+
+def square_index(row, col):
+    """Index of a square in the 64-entry board array"""
+    return row * BOARD_SIZE + col
+
+
+def square_name(row, col):
+    """Algebraic name of a square, e.g. (6, 4) -> 'e2'"""
+    return FILES[col] + str(BOARD_SIZE - row)
+
+
+def parse_square(name):
+    """Inverse of square_name, e.g. 'e2' -> (6, 4)"""
+    if len(name) != 2 or name[0] not in FILES or name[1] not in '12345678':
+        raise ValueError(f"Invalid square: {name!r}")
+    return BOARD_SIZE - int(name[1]), FILES.index(name[0])
+
+
+def move_to_uci(move):
+    """Coordinate notation of a move, e.g. 'e2e4' or 'e7e8q'"""
+    from_row, from_col, to_row, to_col, promotion = move
+    text = square_name(from_row, from_col) + square_name(to_row, to_col)
+    if promotion:
+        text += PIECE_LETTERS[promotion]
+    return text
+
+
+def _build_step_targets(offsets):
+    """For every square, the on-board (row, col) squares one offset away"""
+    table = []
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            table.append([(row + d_row, col + d_col) for d_row, d_col in offsets
+                          if is_valid_board_position(row + d_row, col + d_col)])
+    return table
+
+
+def _build_rays(directions):
+    """For every square, one list of (row, col) squares per direction, nearest first"""
+    table = []
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            rays = []
+            for d_row, d_col in directions:
+                ray = []
+                new_row, new_col = row + d_row, col + d_col
+                while is_valid_board_position(new_row, new_col):
+                    ray.append((new_row, new_col))
+                    new_row, new_col = new_row + d_row, new_col + d_col
+                if ray:
+                    rays.append(ray)
+            table.append(rays)
+    return table
+
+
+def _build_castling_masks():
+    """Rights that survive a move from or to each square"""
+    masks = [WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE] * (BOARD_SIZE * BOARD_SIZE)
+    for row, col, lost in ((7, 4, WHITE_KINGSIDE | WHITE_QUEENSIDE), (7, 7, WHITE_KINGSIDE), (7, 0, WHITE_QUEENSIDE),
+                           (0, 4, BLACK_KINGSIDE | BLACK_QUEENSIDE), (0, 7, BLACK_KINGSIDE), (0, 0, BLACK_QUEENSIDE)):
+        masks[row * BOARD_SIZE + col] &= ~lost
+    return masks
+
+
+CASTLING_RIGHTS_MASKS = _build_castling_masks()
+
+# Precomputed target squares, indexed by square_index(row, col)
+KNIGHT_TARGETS = _build_step_targets(KNIGHT_OFFSETS)
+KING_TARGETS = _build_step_targets(KING_OFFSETS)
+STRAIGHT_RAYS = _build_rays(STRAIGHT_DIRECTIONS)
+DIAGONAL_RAYS = _build_rays(DIAGONAL_DIRECTIONS)
+
+
+def _square_indices(table):
+    """A per-square table of (row, col) lists as square indices"""
+    return [[square_index(row, col) for row, col in squares] for squares in table]
+
+
+def _build_direction_rays():
+    """Per direction of LINE_DIRECTIONS, for every square, the square indices along it (maybe none)"""
+    table = []
+    for d_row, d_col in LINE_DIRECTIONS:
+        rays = []
+        for row in range(BOARD_SIZE):
+            for col in range(BOARD_SIZE):
+                ray = []
+                new_row, new_col = row + d_row, col + d_col
+                while is_valid_board_position(new_row, new_col):
+                    ray.append(square_index(new_row, new_col))
+                    new_row, new_col = new_row + d_row, new_col + d_col
+                rays.append(ray)
+        table.append(rays)
+    return table
+
+
+# Attack map tables, in square indices (see Position.attacks)
+LINE_DIRECTIONS = STRAIGHT_DIRECTIONS + DIAGONAL_DIRECTIONS
+LINE_SLIDERS = [('rook', 'queen')] * len(STRAIGHT_DIRECTIONS) + [('bishop', 'queen')] * len(DIAGONAL_DIRECTIONS)
+OPPOSITE_DIRECTIONS = [LINE_DIRECTIONS.index((-d_row, -d_col)) for d_row, d_col in LINE_DIRECTIONS]
+DIRECTION_INDEX = {direction: index for index, direction in enumerate(LINE_DIRECTIONS)}
+DIRECTION_RAYS = _build_direction_rays()
+# Per square: (ray out, ray the other way, sliders that move along it) for each direction with squares
+LINES_THROUGH = [[(DIRECTION_RAYS[direction][square], DIRECTION_RAYS[OPPOSITE_DIRECTIONS[direction]][square],
+                   LINE_SLIDERS[direction])
+                  for direction in range(len(LINE_DIRECTIONS)) if DIRECTION_RAYS[direction][square]]
+                 for square in range(BOARD_SIZE * BOARD_SIZE)]
+SLIDER_RAYS = {
+    'rook': [[ray for ray in rays if ray] for rays in zip(*DIRECTION_RAYS[:4])],
+    'bishop': [[ray for ray in rays if ray] for rays in zip(*DIRECTION_RAYS[4:])],
+    'queen': [[ray for ray in rays if ray] for rays in zip(*DIRECTION_RAYS)],
+}
+KNIGHT_ATTACKS = _square_indices(KNIGHT_TARGETS)
+KING_ATTACKS = _square_indices(KING_TARGETS)
+PAWN_ATTACKS = {
+    'white': _square_indices(_build_step_targets([(-1, -1), (-1, 1)])),
+    'black': _square_indices(_build_step_targets([(1, -1), (1, 1)])),
+}
+
+
+class Piece:
+    def __init__(self, color, row, col, piece_type):
+        self.color = color  # 'white' or 'black'
+        self.row = row
+        self.col = col
+        self.piece_type = piece_type  # 'pawn', 'rook', 'knight', 'bishop', 'queen', 'king'
+        self.has_moved = False
+        self.index = None  # Slot in Position.pieces while on the board
+
+
+class Position:
+    """A chess position that owns its pieces and the side to move.
+
+    Moves are (from_row, from_col, to_row, to_col, promotion) tuples, with
+    promotion None unless a pawn promotes. Castling is a two-square king
+    move. Row 0 is black's back rank and row 7 is white's back rank. The
+    64-entry board array is kept in sync with the piece list so every
+    square query is one index.
+
+    make_move pushes an undo record onto history and unmake_move pops it,
+    restoring the captured piece, has_moved flags, castling rights, en
+    passant square and piece list order exactly. hash_key is the Zobrist
+    hash of the position and is updated incrementally by make_move.
+    middlegame_score, endgame_score and phase (see evaluation.py) are kept
+    up to date the same way and restored from the undo record.
+
+    attacks[color][square] counts the pieces of that color attacking each
+    square. make_move updates copies of the maps incrementally: only the
+    moved and captured pieces' attacks are redone, plus the slider lines
+    running through the squares a move empties or fills. The undo record
+    keeps the old maps, so unmake_move just puts them back. That makes
+    is_square_under_attack, and with it is_in_check, a lookup, and lets
+    the evaluation score mobility and king safety without generating moves.
+    """
+
+    def __init__(self):
+        self.pieces = []
+        self.board = [None] * (BOARD_SIZE * BOARD_SIZE)
+        self.kings = {}
+        self.current_turn = 'white'
+        self.castling_rights = 0
+        self.en_passant = None  # (row, col) a pawn may capture onto en passant
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.hash_key = 0
+        self.middlegame_score = 0  # Material + piece-square sums, white minus black
+        self.endgame_score = 0
+        self.phase = 0  # Non-pawn material left, weighted by evaluation.PHASE_WEIGHTS
+        self.history = []  # Undo records, one per move played
+        self.attacks = {'white': [0] * (BOARD_SIZE * BOARD_SIZE), 'black': [0] * (BOARD_SIZE * BOARD_SIZE)}
+        self._legal_moves_cache = (None, ())  # (hash_key, moves) of the side to move, see legal_moves
+
+    def _clear(self):
+        """Empty the board and reset the game state"""
+        self.pieces = []
+        self.board = [None] * (BOARD_SIZE * BOARD_SIZE)
+        self.kings = {}
+        self.current_turn = 'white'
+        self.castling_rights = 0
+        self.en_passant = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.hash_key = 0
+        self.middlegame_score = 0
+        self.endgame_score = 0
+        self.phase = 0
+        self.history = []
+        self.attacks = {'white': [0] * (BOARD_SIZE * BOARD_SIZE), 'black': [0] * (BOARD_SIZE * BOARD_SIZE)}
+        self._legal_moves_cache = (None, ())
+
+    def setup_board(self):
+        """Setup the board with all pieces in starting positions"""
+        self._clear()
+        self.castling_rights = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+
+        # White pieces (bottom, rows 6-7), black pieces (top, rows 0-1)
+        for color, pawn_row, back_row in (('white', 6, 7), ('black', 1, 0)):
+            for col in range(BOARD_SIZE):
+                self.add_piece(Piece(color, pawn_row, col, 'pawn'))
+            for col, piece_type in enumerate(BACK_ROW):
+                self.add_piece(Piece(color, back_row, col, piece_type))
+        self.hash_key = self.compute_hash()
+        self.middlegame_score, self.endgame_score, self.phase = self.compute_evaluation()
+        self.attacks = self.compute_attacks()
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Create a position from a FEN string"""
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN (expected at least 4 fields): {fen!r}")
+        position = cls()
+        position._clear()
+
+        rows = fields[0].split('/')
+        if len(rows) != BOARD_SIZE:
+            raise ValueError(f"Invalid FEN board: {fields[0]!r}")
+        for row, text in enumerate(rows):
+            col = 0
+            for char in text:
+                if char.isdigit():
+                    col += int(char)
+                    continue
+                piece_type = LETTER_PIECES.get(char.lower())
+                if piece_type is None or col >= BOARD_SIZE:
+                    raise ValueError(f"Invalid FEN board: {fields[0]!r}")
+                color = 'white' if char.isupper() else 'black'
+                piece = Piece(color, row, col, piece_type)
+                if piece_type == 'pawn':
+                    piece.has_moved = row != (6 if color == 'white' else 1)
+                position.add_piece(piece)
+                col += 1
+            if col != BOARD_SIZE:
+                raise ValueError(f"Invalid FEN board: {fields[0]!r}")
+
+        if fields[1] not in ('w', 'b'):
+            raise ValueError(f"Invalid FEN side to move: {fields[1]!r}")
+        position.current_turn = 'white' if fields[1] == 'w' else 'black'
+        # Rights and en passant squares the board contradicts are dropped
+        for letter, right in CASTLING_LETTERS:
+            if letter in fields[2]:
+                position.castling_rights |= right
+        for color, castlings in CASTLING_MOVES.items():
+            for right, king_col, _, _ in castlings:
+                if not position._has_castling_pieces(color, king_col):
+                    position.castling_rights &= ~right
+        if fields[3] != '-':
+            square = parse_square(fields[3])
+            if position._is_possible_en_passant(*square):
+                position.en_passant = square
+        if len(fields) >= 6:
+            position.halfmove_clock = int(fields[4])
+            position.fullmove_number = int(fields[5])
+        position.hash_key = position.compute_hash()
+        position.middlegame_score, position.endgame_score, position.phase = position.compute_evaluation()
+        position.attacks = position.compute_attacks()
+        return position
+
+    def to_fen(self):
+        """FEN string of the position; Position.from_fen(position.to_fen()) restores it"""
+        rows = []
+        for row in range(BOARD_SIZE):
+            text = ''
+            empty = 0
+            for col in range(BOARD_SIZE):
+                piece = self.board[row * BOARD_SIZE + col]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                letter = PIECE_LETTERS[piece.piece_type]
+                text += letter.upper() if piece.color == 'white' else letter
+            if empty:
+                text += str(empty)
+            rows.append(text)
+        castling = ''.join(letter for letter, right in CASTLING_LETTERS if self.castling_rights & right)
+        en_passant = square_name(*self.en_passant) if self.en_passant is not None else '-'
+        return (f"{'/'.join(rows)} {'w' if self.current_turn == 'white' else 'b'} {castling or '-'} "
+                f"{en_passant} {self.halfmove_clock} {self.fullmove_number}")
+
+    def _en_passant_hash_file(self):
+        """File of the en passant square if the side to move can really capture there.
+
+        Hashing the square only when a capture is possible lets positions
+        that differ just by an unusable en passant square share a hash.
+        """
+        if self.en_passant is None:
+            return None
+        row, col = self.en_passant
+        pawn_row = row + (1 if self.current_turn == 'white' else -1)
+        for pawn_col in (col - 1, col + 1):
+            if 0 <= pawn_col < BOARD_SIZE:
+                piece = self.board[pawn_row * BOARD_SIZE + pawn_col]
+                if piece is not None and piece.piece_type == 'pawn' and piece.color == self.current_turn:
+                    return col
+        return None
+
+    def copy(self):
+        """Independent copy of the position and its history, e.g. to search on another thread"""
+        return copy.deepcopy(self)
+
+    def compute_hash(self):
+        """Compute the Zobrist hash of the position from scratch"""
+        key = 0
+        for piece in self.pieces:
+            key ^= PIECE_KEYS[piece.color][piece.piece_type][piece.row * BOARD_SIZE + piece.col]
+        if self.current_turn == 'black':
+            key ^= BLACK_TO_MOVE_KEY
+        key ^= CASTLING_KEYS[self.castling_rights]
+        en_passant_file = self._en_passant_hash_file()
+        if en_passant_file is not None:
+            key ^= EN_PASSANT_KEYS[en_passant_file]
+        return key
+
+    def compute_evaluation(self):
+        """Compute (middlegame_score, endgame_score, phase) from scratch"""
+        middlegame = endgame = phase = 0
+        for piece in self.pieces:
+            square = piece.row * BOARD_SIZE + piece.col
+            middlegame += MIDDLEGAME_TABLES[piece.color][piece.piece_type][square]
+            endgame += ENDGAME_TABLES[piece.color][piece.piece_type][square]
+            phase += PHASE_WEIGHTS[piece.piece_type]
+        return middlegame, endgame, phase
+
+    def compute_attacks(self):
+        """Compute the attack maps from scratch"""
+        self.attacks = {'white': [0] * (BOARD_SIZE * BOARD_SIZE), 'black': [0] * (BOARD_SIZE * BOARD_SIZE)}
+        for piece in self.pieces:
+            self._add_attacks(piece, piece.row * BOARD_SIZE + piece.col, 1)
+        return self.attacks
+
+    def _add_attacks(self, piece, square, sign):
+        """Add (sign 1) or remove (sign -1) the attacks of a piece standing on square"""
+        counts = self.attacks[piece.color]
+        piece_type = piece.piece_type
+        if piece_type == 'pawn':
+            targets = PAWN_ATTACKS[piece.color][square]
+        elif piece_type == 'knight':
+            targets = KNIGHT_ATTACKS[square]
+        elif piece_type == 'king':
+            targets = KING_ATTACKS[square]
+        else:
+            board = self.board
+            for ray in SLIDER_RAYS[piece_type][square]:
+                for target in ray:
+                    counts[target] += sign
+                    if board[target] is not None:
+                        break
+            return
+        for target in targets:
+            counts[target] += sign
+
+    def _update_lines_through(self, square, sign, skip=None):
+        """Extend (sign 1, square emptied) or cut (sign -1, square about to be filled) slider attacks through square.
+
+        The board must hold everything but square as it is before and after
+        the change. skip is a piece whose attacks are redone separately.
+        """
+        attacks = self.attacks
+        if not attacks['white'][square] and not attacks['black'][square]:
+            return  # A slider whose line runs through square attacks it
+        board = self.board
+        for ray, back_ray, sliders in LINES_THROUGH[square]:
+            for slider_square in ray:
+                slider = board[slider_square]
+                if slider is not None:
+                    if slider.piece_type in sliders and slider is not skip:
+                        counts = attacks[slider.color]
+                        for target in back_ray:
+                            counts[target] += sign
+                            if board[target] is not None:
+                                break
+                    break
+
+    def _relocate(self, piece, from_square, to_square):
+        """Move a piece to an empty square of the board array, keeping the attack maps up to date"""
+        board = self.board
+        self._add_attacks(piece, from_square, -1)
+        board[from_square] = None
+        self._update_lines_through(from_square, 1)
+        self._update_lines_through(to_square, -1)
+        board[to_square] = piece
+        self._add_attacks(piece, to_square, 1)
+
+    def add_piece(self, piece):
+        """Put a piece on the board"""
+        piece.index = len(self.pieces)
+        self.pieces.append(piece)
+        self.board[piece.row * BOARD_SIZE + piece.col] = piece
+        if piece.piece_type == 'king':
+            self.kings[piece.color] = piece
+
+    def remove_piece(self, piece):
+        """Take a piece off the board by moving the last piece into its slot"""
+        pieces = self.pieces
+        last = pieces.pop()
+        if last is not piece:
+            pieces[piece.index] = last
+            last.index = piece.index
+        self.board[piece.row * BOARD_SIZE + piece.col] = None
+
+    def _restore_piece(self, piece):
+        """Undo remove_piece, putting the piece list back in its old order"""
+        pieces = self.pieces
+        index = piece.index
+        if index < len(pieces):
+            displaced = pieces[index]
+            displaced.index = len(pieces)
+            pieces.append(displaced)
+            pieces[index] = piece
+        else:
+            pieces.append(piece)
+        self.board[piece.row * BOARD_SIZE + piece.col] = piece
+
+    def get_piece_at(self, row, col):
+        """Get the piece at a specific board position"""
+        return self.board[row * BOARD_SIZE + col]
+
+    def get_pawn_moves(self, piece):
+        """Calculate the forward moves for a pawn, stopping at the first occupied square"""
+        moves = []
+        direction = -1 if piece.color == 'white' else 1
+
+        # Move 1 square forward
+        new_row = piece.row + direction
+        if not 0 <= new_row < BOARD_SIZE or self.board[new_row * BOARD_SIZE + piece.col] is not None:
+            return moves
+        moves.append((new_row, piece.col))
+
+        # Move 2 squares forward on first move
+        if not piece.has_moved:
+            new_row += direction
+            if 0 <= new_row < BOARD_SIZE and self.board[new_row * BOARD_SIZE + piece.col] is None:
+                moves.append((new_row, piece.col))
+
+        return moves
+
+    def get_pawn_capture_moves(self, piece):
+        """Calculate capture moves for a pawn (diagonal)"""
+        moves = []
+        direction = -1 if piece.color == 'white' else 1
+
+        for col_offset in [-1, 1]:
+            new_row = piece.row + direction
+            new_col = piece.col + col_offset
+            if is_valid_board_position(new_row, new_col):
+                moves.append((new_row, new_col))
+
+        return moves
+
+    def _get_ray_moves(self, piece, rays):
+        """Walk each ray until the edge or the first piece (included)"""
+        board = self.board
+        moves = []
+        for ray in rays[piece.row * BOARD_SIZE + piece.col]:
+            for square in ray:
+                moves.append(square)
+                if board[square[0] * BOARD_SIZE + square[1]] is not None:
+                    break
+        return moves
+
+    def get_rook_moves(self, piece):
+        """Calculate all possible moves for a rook (horizontal and vertical)"""
+        return self._get_ray_moves(piece, STRAIGHT_RAYS)
+
+    def get_knight_moves(self, piece):
+        """Calculate all possible moves for a knight (L-shaped)"""
+        return list(KNIGHT_TARGETS[piece.row * BOARD_SIZE + piece.col])
+
+    def get_bishop_moves(self, piece):
+        """Calculate all possible moves for a bishop (diagonal)"""
+        return self._get_ray_moves(piece, DIAGONAL_RAYS)
+
+    def get_queen_moves(self, piece):
+        """Calculate all possible moves for a queen (rook + bishop)"""
+        moves = []
+        moves.extend(self.get_rook_moves(piece))
+        moves.extend(self.get_bishop_moves(piece))
+        return moves
+
+    def get_king_moves(self, piece):
+        """Calculate all possible moves for a king (one square in any direction)"""
+        board = self.board
+        moves = []
+        for new_row, new_col in KING_TARGETS[piece.row * BOARD_SIZE + piece.col]:
+            target_piece = board[new_row * BOARD_SIZE + new_col]
+            if target_piece is None or target_piece.color != piece.color:
+                moves.append((new_row, new_col))
+        return moves
+
+    def get_king_position(self, color):
+        """Find the position of the king of the given color"""
+        king = self.kings.get(color)
+        if king is None:
+            return None
+        return king.row, king.col
+
+    def is_square_under_attack(self, row, col, attacking_color):
+        """Check if a square is under attack by any piece of the attacking color"""
+        return self.attacks[attacking_color][row * BOARD_SIZE + col] > 0
+
+    def _scan_square_attacked(self, row, col, attacking_color):
+        """is_square_under_attack by scanning the board, for boards changed outside make_move"""
+        board = self.board
+        square = row * BOARD_SIZE + col
+
+        # Straight line attacks (Rook, Queen)
+        for ray in STRAIGHT_RAYS[square]:
+            for check_row, check_col in ray:
+                piece = board[check_row * BOARD_SIZE + check_col]
+                if piece:
+                    if piece.color == attacking_color and (piece.piece_type == 'rook' or piece.piece_type == 'queen'):
+                        return True
+                    break  # Blocked by any piece
+
+        # Diagonal attacks (Bishop, Queen)
+        for ray in DIAGONAL_RAYS[square]:
+            for check_row, check_col in ray:
+                piece = board[check_row * BOARD_SIZE + check_col]
+                if piece:
+                    if piece.color == attacking_color and (piece.piece_type == 'bishop' or piece.piece_type == 'queen'):
+                        return True
+                    break  # Blocked by any piece
+
+        # Knight attacks
+        for check_row, check_col in KNIGHT_TARGETS[square]:
+            piece = board[check_row * BOARD_SIZE + check_col]
+            if piece and piece.color == attacking_color and piece.piece_type == 'knight':
+                return True
+
+        # Pawn attacks
+        # If attacking color is white, they attack from row+1 (since they move -1)
+        # If attacking color is black, they attack from row-1 (since they move +1)
+        check_row = row + (1 if attacking_color == 'white' else -1)
+        if 0 <= check_row < BOARD_SIZE:
+            for check_col in (col - 1, col + 1):
+                if 0 <= check_col < BOARD_SIZE:
+                    piece = board[check_row * BOARD_SIZE + check_col]
+                    if piece and piece.color == attacking_color and piece.piece_type == 'pawn':
+                        return True
+
+        # King attacks (adjacent squares)
+        for check_row, check_col in KING_TARGETS[square]:
+            piece = board[check_row * BOARD_SIZE + check_col]
+            if piece and piece.color == attacking_color and piece.piece_type == 'king':
+                return True
+
+        return False
+
+    def is_in_check(self, color):
+        """Check if the king of the given color is in check"""
+        king_pos = self.get_king_position(color)
+        if king_pos is None:
+            return False  # King not on board (shouldn't happen in normal play)
+        return self.is_square_under_attack(king_pos[0], king_pos[1], opposite_color(color))
+
+    def get_possible_moves(self, piece):
+        """Get the pseudo-legal target squares of a non-pawn piece"""
+        if piece.piece_type == 'rook':
+            return self.get_rook_moves(piece)
+        elif piece.piece_type == 'knight':
+            return self.get_knight_moves(piece)
+        elif piece.piece_type == 'bishop':
+            return self.get_bishop_moves(piece)
+        elif piece.piece_type == 'queen':
+            return self.get_queen_moves(piece)
+        elif piece.piece_type == 'king':
+            return self.get_king_moves(piece)
+        return []
+
+    def _legal_context(self, color):
+        """Find checkers and pinned pieces once for the given side.
+
+        Returns (check_count, evasion_squares, pins). evasion_squares holds
+        the squares where a non-king move resolves a single check (capture
+        the checker or block its ray). pins maps each pinned piece to the
+        squares of its pin line it may still move to.
+        """
+        king = self.kings.get(color)
+        pins = {}
+        if king is None:
+            return 0, None, pins
+        board = self.board
+        row, col = king.row, king.col
+        square = row * BOARD_SIZE + col
+        check_count = 0
+        evasion_squares = None
+
+        for rays, sliders in ((STRAIGHT_RAYS, ('rook', 'queen')), (DIAGONAL_RAYS, ('bishop', 'queen'))):
+            for ray in rays[square]:
+                shield = None
+                for i, (check_row, check_col) in enumerate(ray):
+                    piece = board[check_row * BOARD_SIZE + check_col]
+                    if piece is None:
+                        continue
+                    if piece.color == color:
+                        if shield is not None:
+                            break  # Two own pieces: no pin on this ray
+                        shield = piece
+                        continue
+                    if piece.piece_type in sliders:
+                        if shield is None:
+                            check_count += 1
+                            evasion_squares = set(ray[:i + 1])
+                        else:
+                            pins[shield] = set(ray[:i + 1])
+                    break
+
+        # Knight and pawn checks can only be answered by capturing the checker
+        attacking_color = opposite_color(color)
+        if check_count == self.attacks[attacking_color][square]:
+            return check_count, evasion_squares, pins  # Every attacker of the king is accounted for
+        for check_row, check_col in KNIGHT_TARGETS[square]:
+            piece = board[check_row * BOARD_SIZE + check_col]
+            if piece and piece.color == attacking_color and piece.piece_type == 'knight':
+                check_count += 1
+                evasion_squares = {(check_row, check_col)}
+        check_row = row + (-1 if color == 'white' else 1)
+        if 0 <= check_row < BOARD_SIZE:
+            for check_col in (col - 1, col + 1):
+                if 0 <= check_col < BOARD_SIZE:
+                    piece = board[check_row * BOARD_SIZE + check_col]
+                    if piece and piece.color == attacking_color and piece.piece_type == 'pawn':
+                        check_count += 1
+                        evasion_squares = {(check_row, check_col)}
+
+        return check_count, evasion_squares, pins
+
+    def _is_safe_king_square(self, king, row, col):
+        """Check if the king could stand on the neighbouring square (row, col) without being attacked"""
+        attacking_color = opposite_color(king.color)
+        if self.attacks[attacking_color][row * BOARD_SIZE + col]:
+            return False
+        # The map misses a slider checking the king along the line of the step: the king blocks it
+        direction = DIRECTION_INDEX[(king.row - row, king.col - col)]
+        board = self.board
+        for square in DIRECTION_RAYS[direction][king.row * BOARD_SIZE + king.col]:
+            piece = board[square]
+            if piece is not None:
+                return not (piece.color == attacking_color and piece.piece_type in LINE_SLIDERS[direction])
+        return True
+
+    def _has_castling_pieces(self, color, king_col):
+        """Check that the king and the rook castling toward king_col are on their home squares"""
+        row = 7 if color == 'white' else 0
+        king = self.board[row * BOARD_SIZE + 4]
+        rook = self.board[row * BOARD_SIZE + CASTLING_ROOK_COLS[king_col][0]]
+        return (king is not None and king.piece_type == 'king' and king.color == color
+                and rook is not None and rook.piece_type == 'rook' and rook.color == color)
+
+    def _is_possible_en_passant(self, row, col):
+        """Check that an enemy pawn can just have passed (row, col) with a double step"""
+        board = self.board
+        if self.current_turn == 'white':
+            start_row, pawn_row, pawn_color = 1, 3, 'black'
+        else:
+            start_row, pawn_row, pawn_color = 6, 4, 'white'
+        if row != (start_row + pawn_row) // 2:
+            return False
+        pawn = board[pawn_row * BOARD_SIZE + col]
+        return (board[row * BOARD_SIZE + col] is None and board[start_row * BOARD_SIZE + col] is None
+                and pawn is not None and pawn.piece_type == 'pawn' and pawn.color == pawn_color)
+
+    def _castling_targets(self, king):
+        """Yield the (row, col) king targets of the castling moves available now"""
+        board = self.board
+        row = king.row
+        attacking_color = opposite_color(king.color)
+        for right, king_col, empty_cols, passed_cols in CASTLING_MOVES[king.color]:
+            if not self.castling_rights & right or not self._has_castling_pieces(king.color, king_col):
+                continue
+            if any(board[row * BOARD_SIZE + col] is not None for col in empty_cols):
+                continue
+            if any(self.is_square_under_attack(row, col, attacking_color) for col in passed_cols):
+                continue
+            yield row, king_col
+
+    def _is_legal_en_passant(self, piece, move_row, move_col):
+        """Check an en passant capture by trying it on the board array.
+
+        Two pawns leave the capturer's rank at once, so neither the pin
+        lines nor the evasion squares describe it; it is rare enough to
+        test directly.
+        """
+        king = self.kings.get(piece.color)
+        if king is None:
+            return True
+        board = self.board
+        from_square = piece.row * BOARD_SIZE + piece.col
+        captured_square = piece.row * BOARD_SIZE + move_col
+        target_square = move_row * BOARD_SIZE + move_col
+        captured_piece = board[captured_square]
+        board[from_square] = None
+        board[captured_square] = None
+        board[target_square] = piece
+        in_check = self._scan_square_attacked(king.row, king.col, opposite_color(piece.color))
+        board[target_square] = None
+        board[captured_square] = captured_piece
+        board[from_square] = piece
+        return not in_check
+
+    def _iter_piece_targets(self, piece, context):
+        """Yield the (row, col) squares a piece may legally move to"""
+        check_count, evasion_squares, pins = context
+        if piece.piece_type == 'king':
+            for move_row, move_col in self.get_king_moves(piece):
+                if self._is_safe_king_square(piece, move_row, move_col):
+                    yield move_row, move_col
+            if check_count == 0 and self.castling_rights:
+                yield from self._castling_targets(piece)
+            return
+        if check_count > 1:
+            return  # Double check: only the king can move
+
+        board = self.board
+        allowed = pins.get(piece)
+        if evasion_squares is not None:
+            allowed = evasion_squares if allowed is None else allowed & evasion_squares
+
+        if piece.piece_type == 'pawn':
+            targets = self.get_pawn_moves(piece)
+            for move_row, move_col in self.get_pawn_capture_moves(piece):
+                target_piece = board[move_row * BOARD_SIZE + move_col]
+                if target_piece is not None and target_piece.color != piece.color:
+                    targets.append((move_row, move_col))
+                elif (move_row, move_col) == self.en_passant and self._is_legal_en_passant(piece, move_row, move_col):
+                    yield move_row, move_col
+        else:
+            targets = self.get_possible_moves(piece)
+
+        color = piece.color
+        for target in targets:
+            if allowed is not None and target not in allowed:
+                continue
+            target_piece = board[target[0] * BOARD_SIZE + target[1]]
+            if target_piece is None or target_piece.color != color:
+                yield target
+
+    def iter_legal_moves(self, color=None):
+        """Yield every legal move of the given color (default: side to move)"""
+        if color is None:
+            color = self.current_turn
+        context = self._legal_context(color)
+        for piece in self.pieces:
+            if piece.color == color:
+                from_row, from_col = piece.row, piece.col
+                promotes = piece.piece_type == 'pawn' and from_row == (1 if color == 'white' else BOARD_SIZE - 2)
+                for move_row, move_col in self._iter_piece_targets(piece, context):
+                    if promotes:
+                        for promotion in PROMOTION_TYPES:
+                            yield from_row, from_col, move_row, move_col, promotion
+                    else:
+                        yield from_row, from_col, move_row, move_col, None
+
+    def legal_moves(self, color=None):
+        """List every legal move of the given color (default: side to move).
+
+        The side to move's moves are generated once per position and kept,
+        keyed by hash_key, so the move highlights, the game-over check and
+        the AI share one generation per ply. Playing or taking back a move
+        changes hash_key, which is all the invalidation the cache needs.
+        """
+        if color is not None and color != self.current_turn:
+            return list(self.iter_legal_moves(color))
+        key, moves = self._legal_moves_cache
+        if key != self.hash_key:
+            moves = tuple(self.iter_legal_moves())
+            self._legal_moves_cache = (self.hash_key, moves)
+        return list(moves)
+
+    def has_legal_moves(self, color):
+        """Check if the player has any legal moves, stopping at the first one"""
+        key, moves = self._legal_moves_cache
+        if color == self.current_turn and key == self.hash_key:
+            return bool(moves)
+        for _ in self.iter_legal_moves(color):
+            return True
+        return False
+
+    def pseudo_legal_moves(self, color=None):
+        """List moves that obey piece movement but may leave the king in check.
+
+        Castling still requires that the king does not start in, pass
+        through or land on an attacked square.
+        """
+        if color is None:
+            color = self.current_turn
+        no_constraints = (0, None, {})
+        moves = []
+        for piece in self.pieces:
+            if piece.color != color:
+                continue
+            from_row, from_col = piece.row, piece.col
+            if piece.piece_type == 'king':
+                targets = self.get_king_moves(piece)
+                if not self.is_in_check(color):
+                    targets.extend(self._castling_targets(piece))
+            elif piece.piece_type == 'pawn':
+                targets = self.get_pawn_moves(piece)
+                for move_row, move_col in self.get_pawn_capture_moves(piece):
+                    target_piece = self.board[move_row * BOARD_SIZE + move_col]
+                    if (target_piece is not None and target_piece.color != color) or (move_row, move_col) == self.en_passant:
+                        targets.append((move_row, move_col))
+            else:
+                targets = self._iter_piece_targets(piece, no_constraints)
+            promotes = piece.piece_type == 'pawn' and from_row == (1 if color == 'white' else BOARD_SIZE - 2)
+            for move_row, move_col in targets:
+                for promotion in (PROMOTION_TYPES if promotes else (None,)):
+                    moves.append((from_row, from_col, move_row, move_col, promotion))
+        return moves
+
+    def check_moves(self, piece):
+        """Categorize the moves of a piece as valid, blocked, or capture.
+
+        Returns a (valid_moves, blocked_moves, capture_moves) tuple of
+        (row, col) lists. Blocked moves are squares the piece reaches but
+        may not go to, because an own piece stands there or the move would
+        leave its king in check.
+        """
+        valid_moves = []
+        blocked_moves = []
+        capture_moves = []
+        if piece.color == self.current_turn:
+            square = (piece.row, piece.col)
+            legal_targets = {move[2:4] for move in self.legal_moves() if move[:2] == square}
+        else:
+            legal_targets = set(self._iter_piece_targets(piece, self._legal_context(piece.color)))
+
+        if piece.piece_type == 'pawn':
+            candidates = self.get_pawn_moves(piece)
+            for move_row, move_col in self.get_pawn_capture_moves(piece):
+                if self.get_piece_at(move_row, move_col) is not None or (move_row, move_col) == self.en_passant:
+                    candidates.append((move_row, move_col))
+        elif piece.piece_type == 'king':
+            candidates = self.get_king_moves(piece) + [target for target in legal_targets
+                                                       if abs(target[1] - piece.col) == 2]
+        else:
+            candidates = self.get_possible_moves(piece)
+
+        for target in candidates:
+            if target not in legal_targets:
+                blocked_moves.append(target)
+            elif self.get_piece_at(*target) is not None or (piece.piece_type == 'pawn' and target[1] != piece.col):
+                capture_moves.append(target)
+            else:
+                valid_moves.append(target)
+
+        return valid_moves, blocked_moves, capture_moves
+
+    def make_move(self, move):
+        """Play a (from_row, from_col, to_row, to_col, promotion) move and push its undo record"""
+        from_row, from_col, to_row, to_col, promotion = move
+        board = self.board
+        piece = board[from_row * BOARD_SIZE + from_col]
+        captured_piece = board[to_row * BOARD_SIZE + to_col]
+        captures_on_target = captured_piece is not None
+        is_pawn = piece.piece_type == 'pawn'
+        if is_pawn and captured_piece is None and from_col != to_col:
+            captured_piece = board[from_row * BOARD_SIZE + to_col]  # En passant
+        attacks = self.attacks
+        self.history.append((move, piece, captured_piece, piece.has_moved,
+                             self.castling_rights, self.en_passant, self.halfmove_clock, self.hash_key,
+                             self.middlegame_score, self.endgame_score, self.phase, attacks))
+        # The maps are updated on copies; unmake_move puts the old ones back
+        self.attacks = {'white': attacks['white'][:], 'black': attacks['black'][:]}
+        color = piece.color
+        from_square = from_row * BOARD_SIZE + from_col
+        to_square = to_row * BOARD_SIZE + to_col
+        middlegame_tables = MIDDLEGAME_TABLES[color]
+        endgame_tables = ENDGAME_TABLES[color]
+        middlegame = self.middlegame_score - middlegame_tables[piece.piece_type][from_square]
+        endgame = self.endgame_score - endgame_tables[piece.piece_type][from_square]
+        piece_keys = PIECE_KEYS[color]
+        key = self.hash_key ^ BLACK_TO_MOVE_KEY ^ piece_keys[piece.piece_type][from_square]
+        if self.en_passant is not None:
+            en_passant_file = self._en_passant_hash_file()
+            if en_passant_file is not None:
+                key ^= EN_PASSANT_KEYS[en_passant_file]
+        self._add_attacks(piece, from_square, -1)
+        if captured_piece is not None:
+            captured_type = captured_piece.piece_type
+            captured_square = captured_piece.row * BOARD_SIZE + captured_piece.col
+            key ^= PIECE_KEYS[captured_piece.color][captured_type][captured_square]
+            middlegame -= MIDDLEGAME_TABLES[captured_piece.color][captured_type][captured_square]
+            endgame -= ENDGAME_TABLES[captured_piece.color][captured_type][captured_square]
+            self.phase -= PHASE_WEIGHTS[captured_type]
+            self._add_attacks(captured_piece, captured_square, -1)
+            self.remove_piece(captured_piece)
+            if not captures_on_target:
+                self._update_lines_through(captured_square, 1, piece)  # En passant
+
+        # Attack maps: one square changes at a time, so each line update sees a consistent board
+        board[from_square] = None
+        if captures_on_target:
+            board[to_square] = piece
+            self._update_lines_through(from_square, 1, piece)
+        else:
+            self._update_lines_through(from_square, 1)
+            self._update_lines_through(to_square, -1)
+            board[to_square] = piece
+        piece.row = to_row
+        piece.col = to_col
+        piece.has_moved = True
+        if promotion is not None:
+            piece.piece_type = promotion
+            self.phase += PHASE_WEIGHTS[promotion]
+        elif piece.piece_type == 'king' and abs(to_col - from_col) == 2:
+            rook_from_col, rook_to_col = CASTLING_ROOK_COLS[to_col]
+            rook_from_square = from_row * BOARD_SIZE + rook_from_col
+            rook_to_square = from_row * BOARD_SIZE + rook_to_col
+            rook = board[rook_from_square]
+            self._relocate(rook, rook_from_square, rook_to_square)
+            rook.col = rook_to_col
+            rook.has_moved = True
+            key ^= piece_keys['rook'][rook_from_square] ^ piece_keys['rook'][rook_to_square]
+            middlegame += middlegame_tables['rook'][rook_to_square] - middlegame_tables['rook'][rook_from_square]
+            endgame += endgame_tables['rook'][rook_to_square] - endgame_tables['rook'][rook_from_square]
+        self._add_attacks(piece, to_square, 1)
+        key ^= piece_keys[piece.piece_type][to_square]
+        self.middlegame_score = middlegame + middlegame_tables[piece.piece_type][to_square]
+        self.endgame_score = endgame + endgame_tables[piece.piece_type][to_square]
+
+        if self.castling_rights:
+            rights = self.castling_rights & CASTLING_RIGHTS_MASKS[from_square] & CASTLING_RIGHTS_MASKS[to_square]
+            key ^= CASTLING_KEYS[self.castling_rights] ^ CASTLING_KEYS[rights]
+            self.castling_rights = rights
+        self.en_passant = None
+        if is_pawn and abs(to_row - from_row) == 2:
+            self.en_passant = ((from_row + to_row) // 2, from_col)
+            # Only hashed when an enemy pawn stands beside the pushed pawn
+            for pawn_col in (to_col - 1, to_col + 1):
+                if 0 <= pawn_col < BOARD_SIZE:
+                    neighbour = board[to_row * BOARD_SIZE + pawn_col]
+                    if neighbour is not None and neighbour.piece_type == 'pawn' and neighbour.color != color:
+                        key ^= EN_PASSANT_KEYS[to_col]
+                        break
+        self.hash_key = key
+        if is_pawn or captured_piece is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if self.current_turn == 'white':
+            self.current_turn = 'black'
+        else:
+            self.current_turn = 'white'
+            self.fullmove_number += 1
+        return captured_piece
+
+    def unmake_move(self):
+        """Take back the last move played, returning it"""
+        (move, piece, captured_piece, had_moved,
+         self.castling_rights, self.en_passant, self.halfmove_clock, self.hash_key,
+         self.middlegame_score, self.endgame_score, self.phase, self.attacks) = self.history.pop()
+        from_row, from_col, to_row, to_col, promotion = move
+        board = self.board
+        if promotion is not None:
+            piece.piece_type = 'pawn'
+        elif piece.piece_type == 'king' and abs(to_col - from_col) == 2:
+            rook_from_col, rook_to_col = CASTLING_ROOK_COLS[to_col]
+            rook = board[from_row * BOARD_SIZE + rook_to_col]
+            board[from_row * BOARD_SIZE + rook_to_col] = None
+            board[from_row * BOARD_SIZE + rook_from_col] = rook
+            rook.col = rook_from_col
+            rook.has_moved = False
+        board[to_row * BOARD_SIZE + to_col] = None
+        if captured_piece is not None:
+            self._restore_piece(captured_piece)  # Back on to_square, or beside it for en passant
+        board[from_row * BOARD_SIZE + from_col] = piece
+        piece.row = from_row
+        piece.col = from_col
+        piece.has_moved = had_moved
+        if self.current_turn == 'white':
+            self.current_turn = 'black'
+            self.fullmove_number -= 1
+        else:
+            self.current_turn = 'white'
+        return move
+
+    def is_repetition(self, count=2):
+        """Has the position occurred count times (this one included) since the last irreversible move?"""
+        key = self.hash_key
+        history = self.history
+        seen = 1
+        for back in range(2, min(self.halfmove_clock, len(history)) + 1, 2):
+            if history[-back][7] == key:  # The hash_key slot of make_move's undo record
+                seen += 1
+                if seen >= count:
+                    return True
+        return seen >= count
+
+    def game_result(self):
+        """Return None while the game goes on, else the winner color or 'draw'"""
+        if self.legal_moves():  # Full list: the GUI and AI reuse it from the cache
+            return None
+        if self.is_in_check(self.current_turn):
+            return opposite_color(self.current_turn)  # Checkmate
+        return 'draw'  # Stalemate
+
+
+def new_game():
+    """Create a position set up for a new game"""
+    position = Position()
+    position.setup_board()
+    return position
+
+
+def move_to_san(position, move):
+    """Standard algebraic notation of a legal move in position, e.g. 'Nbd7', 'exd5', 'e8=Q+'"""
+    from_row, from_col, to_row, to_col, promotion = move
+    piece = position.board[from_row * BOARD_SIZE + from_col]
+    if piece.piece_type == 'king' and abs(to_col - from_col) == 2:
+        text = 'O-O' if to_col == 6 else 'O-O-O'
+    else:
+        is_capture = (position.board[to_row * BOARD_SIZE + to_col] is not None
+                      or (piece.piece_type == 'pawn' and from_col != to_col))
+        target = square_name(to_row, to_col)
+        if piece.piece_type == 'pawn':
+            text = (FILES[from_col] + 'x' if is_capture else '') + target
+            if promotion is not None:
+                text += '=' + PIECE_LETTERS[promotion].upper()
+        else:
+            # Name the from file, else rank, else both, if another piece of the type can go there too
+            rivals = [(row, col) for row, col, rival_row, rival_col, _ in position.legal_moves()
+                      if (rival_row, rival_col) == (to_row, to_col) and (row, col) != (from_row, from_col)
+                      and position.board[row * BOARD_SIZE + col].piece_type == piece.piece_type]
+            disambiguation = ''
+            if rivals:
+                if all(col != from_col for _, col in rivals):
+                    disambiguation = FILES[from_col]
+                elif all(row != from_row for row, _ in rivals):
+                    disambiguation = str(BOARD_SIZE - from_row)
+                else:
+                    disambiguation = square_name(from_row, from_col)
+            text = PIECE_LETTERS[piece.piece_type].upper() + disambiguation + ('x' if is_capture else '') + target
+    position.make_move(move)
+    if position.is_in_check(position.current_turn):
+        text += '+' if position.has_legal_moves(position.current_turn) else '#'
+    position.unmake_move()
+    return text
+
+
+def move_from_san(position, text):
+    """The legal move that standard algebraic notation names in position.
+
+    Raises ValueError if the text names no legal move or more than one.
+    """
+    san = text.rstrip('+#!?')
+    color = position.current_turn
+    if san in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        king = position.kings[color]
+        move = (king.row, king.col, king.row, 6 if len(san) == 3 else 2, None)
+        if move not in position.legal_moves():
+            raise ValueError(f"Illegal move: {text!r}")
+        return move
+    match = SAN_PATTERN.fullmatch(san)
+    if match is None:
+        raise ValueError(f"Invalid move: {text!r}")
+    letter, from_file, from_rank, _, target, promotion = match.groups()
+    piece_type = LETTER_PIECES[letter.lower()] if letter else 'pawn'
+    to_row, to_col = parse_square(target)
+    promotion = LETTER_PIECES[promotion.lower()] if promotion else None
+    candidates = [
+        move for move in position.legal_moves()
+        if move[2] == to_row and move[3] == to_col and move[4] == promotion
+        and position.board[move[0] * BOARD_SIZE + move[1]].piece_type == piece_type
+        and (from_file is None or move[1] == FILES.index(from_file))
+        and (from_rank is None or move[0] == BOARD_SIZE - int(from_rank))
+    ]
+    if len(candidates) != 1:
+        raise ValueError(f"{'Ambiguous' if candidates else 'Illegal'} move: {text!r}")
+    return candidates[0]
+
@@ -0,0 +1,152 @@
+"""Batch analysis of EPD (or FEN) position files, one JSON line per position.
+
+    python epd.py positions.epd
+    python epd.py positions.epd --depth 4 > results.jsonl
+    zcat positions.epd.gz | python epd.py - --time 0.5
+
+Each line is read, parsed, analysed and written before the next one is
+read: the stages are chained generators, so memory use stays flat however
+long the file is. Every output line has the legal moves and the check /
+mate status; with --depth or --time it also has a search result. A line
+that cannot be parsed produces an "error" record and the run goes on.
+A summary is written to stderr at the end.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from engine import Position, move_to_uci
+from search import Searcher
+from tt import DEFAULT_MEGABYTES, TranspositionTable
+
+
+def parse_operations(text):
+    """EPD operations as a dict, e.g. 'bm Nf3; id "test 1";' -> {'bm': 'Nf3', 'id': 'test 1'}"""
+    operations = {}
+    operation = ''
+    in_quotes = False
+    for char in text + ';':
+        if char == '"':
+            in_quotes = not in_quotes
+        if char == ';' and not in_quotes:
+            opcode, _, operands = operation.strip().partition(' ')
+            if opcode:
+                operands = operands.strip()
+                if len(operands) >= 2 and operands[0] == operands[-1] == '"':
+                    operands = operands[1:-1]
+                operations[opcode] = operands
+            operation = ''
+        else:
+            operation += char
+    return operations
+
+
+def parse_epd(line):
+    """(position, operations) from an EPD line; a plain FEN line also works"""
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"Invalid EPD (expected at least 4 fields): {line!r}")
+    rest = fields[4] if len(fields) == 5 else ''
+    counters = rest.split()
+    if len(counters) == 2 and all(counter.isdigit() for counter in counters):
+        return Position.from_fen(line), {}  # FEN move counters, not operations
+    operations = parse_operations(rest)
+    fen = ' '.join(fields[:4] + [operations.get('hmvc', '0'), operations.get('fmvn', '1')])
+    return Position.from_fen(fen), operations
+
+
+def read_lines(stream):
+    """(line number, text) for each line that holds a position"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line_number, line
+
+
+def parse_lines(lines):
+    """(line number, position, operations), or (line number, None, error message)"""
+    for line_number, line in lines:
+        try:
+            position, operations = parse_epd(line)
+        except ValueError as error:
+            yield line_number, None, str(error)
+        else:
+            yield line_number, position, operations
+
+
+def analyse(records, searcher=None):
+    """A JSON-ready dict per record, searched too if a Searcher is given"""
+    for line_number, position, operations in records:
+        if position is None:
+            yield {'line': line_number, 'error': operations}
+            continue
+        color = position.current_turn
+        moves = position.legal_moves()
+        in_check = position.is_in_check(color)
+        if moves:
+            status = 'ongoing'
+        else:
+            status = 'checkmate' if in_check else 'stalemate'
+        result = {
+            'line': line_number,
+            'id': operations.get('id'),
+            'fen': position.to_fen(),
+            'side_to_move': color,
+            'check': in_check,
+            'status': status,
+            'legal_moves': [move_to_uci(move) for move in moves],
+            'operations': operations,
+        }
+        if searcher is not None and moves:
+            found = searcher.search(position)
+            result['search'] = {
+                'move': move_to_uci(found.move),
+                'score': found.score,
+                'depth': found.depth,
+                'nodes': found.nodes,
+                'pv': [move_to_uci(move) for move in found.pv],
+            }
+        yield result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help="EPD or FEN file, one position per line ('-' for stdin)")
+    parser.add_argument('--depth', type=int, help='also search each position to this depth')
+    parser.add_argument('--time', type=float, help='also search each position for this many seconds')
+    parser.add_argument('--table-megabytes', type=float, default=DEFAULT_MEGABYTES,
+                        help='transposition table size for the search')
+    args = parser.parse_args(argv)
+    if args.depth is not None and args.depth < 1:
+        parser.error('--depth must be at least 1')
+
+    searcher = None
+    if args.depth is not None or args.time is not None:
+        max_depth = 64 if args.depth is None else args.depth
+        searcher = Searcher(TranspositionTable(args.table_megabytes), max_depth=max_depth,
+                            max_time=args.time)
+
+    stream = sys.stdin if args.path == '-' else open(args.path)
+    start = time.perf_counter()
+    positions = errors = 0
+    try:
+        for result in analyse(parse_lines(read_lines(stream)), searcher):
+            if 'error' in result:
+                errors += 1
+            else:
+                positions += 1
+            sys.stdout.write(json.dumps(result) + '\n')
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    seconds = time.perf_counter() - start
+    json.dump({'positions': positions, 'errors': errors, 'seconds': round(seconds, 4),
+               'positions_per_second': round(positions / seconds) if seconds > 0 else None}, sys.stderr)
+    print(file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
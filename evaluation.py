@@ -0,0 +1,136 @@
+"""Material and piece-square tables for the evaluation.
+
+Every piece scores a middlegame and an endgame value for its square
+(material included). engine.Position keeps the sums of both, plus a game
+phase counted from the non-pawn material left, and updates them by the
+deltas each move causes, the same way it keeps its Zobrist hash. The final
+score blends the two sums by phase ("tapered" evaluation), so evaluating a
+position costs the same however many pieces are on the board.
+
+Mobility and king safety come from the attack maps engine.Position keeps
+up to date (see MOBILITY_WEIGHTS and KING_ZONE_WEIGHTS): each is a few
+sums over the maps, not a move generation.
+
+Tables are written from white's side with row 0 (the 8th rank) first,
+matching the board layout; black's entries are mirrored and negated, so
+sums are always from white's point of view.
+"""
+
+MIDDLEGAME_VALUES = {'pawn': 82, 'knight': 337, 'bishop': 365, 'rook': 477, 'queen': 1025, 'king': 0}
+ENDGAME_VALUES = {'pawn': 94, 'knight': 281, 'bishop': 297, 'rook': 512, 'queen': 936, 'king': 0}
+
+# Attack map terms, read from engine.Position.attacks when a position is scored,
+# as (middlegame, endgame) centipawns: per attack of the side's pieces on any
+# square, and per enemy attack on the side's king square and its neighbours
+MOBILITY_WEIGHTS = (3, 2)
+KING_ZONE_WEIGHTS = (8, 0)
+
+# Phase is MAX_PHASE with all minor and major pieces on the board, 0 with none
+PHASE_WEIGHTS = {'pawn': 0, 'knight': 1, 'bishop': 1, 'rook': 2, 'queen': 4, 'king': 0}
+MAX_PHASE = 24
+
+_PAWN = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+_PAWN_ENDGAME = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    15, 15, 15, 15, 15, 15, 15, 15,
+    5, 5, 5, 5, 5, 5, 5, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+_KNIGHT = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+_BISHOP = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+_ROOK = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+]
+_QUEEN = [
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+]
+_KING = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+]
+_KING_ENDGAME = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+]
+
+_MIDDLEGAME_SQUARES = {'pawn': _PAWN, 'knight': _KNIGHT, 'bishop': _BISHOP, 'rook': _ROOK,
+                       'queen': _QUEEN, 'king': _KING}
+_ENDGAME_SQUARES = dict(_MIDDLEGAME_SQUARES, pawn=_PAWN_ENDGAME, king=_KING_ENDGAME)
+
+
+def _build_tables(values, squares):
+    """TABLE[color][piece_type][row * 8 + col] -> signed score including material"""
+    tables = {'white': {}, 'black': {}}
+    for piece_type, table in squares.items():
+        value = values[piece_type]
+        tables['white'][piece_type] = [value + bonus for bonus in table]
+        tables['black'][piece_type] = [-(value + table[(7 - square // 8) * 8 + square % 8])
+                                       for square in range(64)]
+    return tables
+
+
+MIDDLEGAME_TABLES = _build_tables(MIDDLEGAME_VALUES, _MIDDLEGAME_SQUARES)
+ENDGAME_TABLES = _build_tables(ENDGAME_VALUES, _ENDGAME_SQUARES)
+
+
+def tapered_score(middlegame, endgame, phase):
+    """Blend middlegame and endgame scores by how much material is left"""
+    phase = min(phase, MAX_PHASE)  # Early promotions can push it past the start
+    return (middlegame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
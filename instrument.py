@@ -0,0 +1,241 @@
+"""Opt-in call counters and latency histograms for the engine's hot paths.
+
+    python instrument.py --depth 4
+    python instrument.py --fen "<fen>" --time 2 --out profile.json
+    python chess.py --profile profile.json    # F3 toggles the overlay
+
+enable() wraps what the search spends its time in (iter_legal_moves,
+_legal_context, make_move, unmake_move, is_in_check), the GUI's
+check_moves and the searchers' search() in timing wrappers, and disable()
+puts the originals back. Until enable() is called nothing is wrapped, so
+instrumentation costs nothing when it is off. Each wrapped call is
+counted and timed into a histogram with power-of-two microsecond buckets;
+for iter_legal_moves that is the time spent generating, summed over the
+whole iteration. search() adds the nodes it searched to the
+'search_nodes' counter and quiescence nodes are counted as
+'quiescence_nodes'. Other callables, such as the GUI's frame drawing, can
+be timed the same way with patch().
+
+The first hot-path list (get_piece_at, is_square_under_attack,
+simulate_move) went cold as the move generator changed; ALIASES maps
+each of those names to what does its work now.
+
+Timings include the wrappers' own cost, which matters for the few-
+microsecond make_move and unmake_move: compare their counts, not their
+times.
+"""
+
+import argparse
+import functools
+import inspect
+import json
+import sys
+import time
+
+from engine import START_FEN, Position
+from parallel import ParallelSearcher
+from search import Searcher
+
+BUCKETS = 32  # Bucket i holds calls that took under 2**i microseconds (and at least half that)
+HOT_PATHS = [
+    (Position, 'iter_legal_moves'),
+    (Position, '_legal_context'),
+    (Position, 'make_move'),
+    (Position, 'unmake_move'),
+    (Position, 'is_in_check'),
+    (Position, 'check_moves'),
+]
+SEARCHERS = [(Searcher, 'search'), (ParallelSearcher, 'search')]
+COUNTED = [(Searcher, '_quiescence', 'quiescence_nodes')]  # (owner, attribute, counter name)
+# Hot paths of the first version -> the timing that now covers their work
+ALIASES = {
+    'get_piece_at': 'iter_legal_moves',  # Square reads happen inside move generation
+    'is_square_under_attack': 'is_in_check',  # The only attack query left on the search path
+    'simulate_move': '_legal_context',  # Legality comes from pins and checkers, not trial moves
+}
+
+enabled = False
+counters = {}  # Name -> running total, e.g. 'search_nodes'
+histograms = {}  # Name -> Histogram of call latencies
+_originals = []  # (owner, attribute, original) for disable()
+
+
+class Histogram:
+    """Call count, total time and power-of-two microsecond latency buckets"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[min(int(seconds * 1e6).bit_length(), BUCKETS - 1)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound in microseconds of the bucket holding the given fraction of calls"""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return 1 << index
+        return 1 << (BUCKETS - 1)
+
+    def to_dict(self):
+        return {
+            'calls': self.count,
+            'total_seconds': round(self.total, 6),
+            'mean_us': round(self.total / self.count * 1e6, 2) if self.count else None,
+            'max_us': round(self.max * 1e6, 1),
+            'p50_us': self.percentile(0.5),
+            'p90_us': self.percentile(0.9),
+            'p99_us': self.percentile(0.99),
+            'buckets_us': {f"<{1 << index}": count for index, count in enumerate(self.buckets) if count},
+        }
+
+
+def _timed(function, histogram):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.add(time.perf_counter() - start)
+    return wrapper
+
+
+def _timed_iteration(function, histogram):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        iterator = function(*args, **kwargs)
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            iterator.close()  # A caller that stops early (a beta cutoff) still gets its call timed
+            histogram.add(elapsed)
+    return wrapper
+
+
+def _counted(function, name):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        counters[name] = counters.get(name, 0) + 1
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def _timed_search(function, histogram):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        histogram.add(time.perf_counter() - start)
+        counters['search_nodes'] = counters.get('search_nodes', 0) + result.nodes
+        return result
+    return wrapper
+
+
+def patch(owner, attribute, name=None, wrap=None):
+    """Time calls to owner.attribute (a class or module) under name until disable()"""
+    original = getattr(owner, attribute)
+    if wrap is None:
+        wrap = _timed_iteration if inspect.isgeneratorfunction(original) else _timed
+    histogram = histograms.setdefault(name or attribute, Histogram())
+    _originals.append((owner, attribute, original))
+    setattr(owner, attribute, wrap(original, histogram))
+
+
+def enable():
+    """Start counting and timing the hot paths and searches"""
+    global enabled
+    if enabled:
+        return
+    enabled = True
+    for owner, attribute in HOT_PATHS:
+        patch(owner, attribute)
+    for owner, attribute in SEARCHERS:
+        patch(owner, attribute, 'search', _timed_search)
+    for owner, attribute, name in COUNTED:
+        _originals.append((owner, attribute, getattr(owner, attribute)))
+        setattr(owner, attribute, _counted(getattr(owner, attribute), name))
+
+
+def disable():
+    """Put every patched callable back; the numbers are kept until reset()"""
+    global enabled
+    while _originals:
+        owner, attribute, original = _originals.pop()
+        setattr(owner, attribute, original)
+    enabled = False
+
+
+def reset():
+    """Zero all counters and histograms"""
+    counters.clear()
+    for histogram in histograms.values():
+        histogram.clear()
+
+
+def report():
+    """Everything recorded so far as a JSON-ready dict"""
+    return {
+        'enabled': enabled,
+        'counters': dict(counters),
+        'timings': {name: histogram.to_dict() for name, histogram in sorted(histograms.items())},
+        'aliases': dict(ALIASES),
+    }
+
+
+def dump(path):
+    """Write report() to a JSON file ('-' for stdout)"""
+    if path == '-':
+        json.dump(report(), sys.stdout, indent=2)
+        print()
+        return
+    with open(path, 'w') as stream:
+        json.dump(report(), stream, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fen', default=START_FEN, help='position to search (default: the start position)')
+    parser.add_argument('--depth', type=int, default=4, help='iterative deepening depth limit')
+    parser.add_argument('--time', type=float, help='seconds to search (default: no limit)')
+    parser.add_argument('--out', default='-', help="JSON file to write ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    position = Position.from_fen(args.fen)
+    enable()
+    try:
+        Searcher(max_depth=args.depth, max_time=args.time).search(position)
+        for piece in position.pieces:
+            if piece.color == position.current_turn:
+                position.check_moves(piece)  # What the GUI does when a piece is clicked
+    finally:
+        disable()
+    dump(args.out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
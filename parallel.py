@@ -0,0 +1,104 @@
+"""Multi-core search with Lazy SMP.
+
+One Python process only ever runs on one core, so ParallelSearcher runs a
+Searcher in each of several worker processes. All of them search the same
+position and share one transposition table placed in shared memory: the
+workers race down the same tree and each one's results cut the others'
+work short. Every other helper searches one ply deeper than the main
+worker so they fill the table ahead of it. The main worker (worker 0)
+decides the budget; when it finishes the helpers are told to stop, and
+the deepest completed result is played.
+
+The pool and the shared table live as long as the ParallelSearcher, so
+create one per game (or program), not one per move, and close() it when
+done.
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+
+from search import Searcher, SearchResult
+from tt import TranspositionTable
+
+_worker_memory = None  # Worker process state, set by _init_worker
+_worker_table = None
+_worker_stop = None
+
+
+def _init_worker(memory_name, megabytes, stop_event):
+    """Attach a pool process to the shared table and stop flag"""
+    global _worker_memory, _worker_table, _worker_stop
+    _worker_memory = SharedMemory(name=memory_name)
+    _worker_table = TranspositionTable(megabytes, buffer=_worker_memory.buf)
+    _worker_stop = stop_event
+
+
+def _worker_search(position, worker_id, age, budget):
+    """Run one worker's search on the shared table"""
+    _worker_table.age = age  # Searcher.search advances it to the same age in every worker
+    searcher = Searcher(table=_worker_table, stop_event=_worker_stop, depth_offset=worker_id % 2, **budget)
+    return searcher.search(position)
+
+
+class ParallelSearcher:
+    """Searcher look-alike that spreads a search over worker processes"""
+
+    def __init__(self, workers=None, table_megabytes=64, max_time=None, max_nodes=None, max_depth=64,
+                 stop_event=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.max_time = max_time  # Seconds per move, or None
+        self.max_nodes = max_nodes  # Nodes for the main worker, or None
+        self.max_depth = max_depth
+        self.stop_event = stop_event  # threading.Event to abort from outside
+        self._memory = SharedMemory(create=True, size=int(table_megabytes * 1024 * 1024))
+        self.table = TranspositionTable(table_megabytes, buffer=self._memory.buf)
+        self._stop = multiprocessing.Event()
+        self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                         initargs=(self._memory.name, table_megabytes, self._stop))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop the worker processes and free the shared table"""
+        if self._pool is None:
+            return
+        self._stop.set()
+        self._pool.shutdown()
+        self._pool = None
+        self.table = None  # Drop the view before closing the memory under it
+        self._memory.close()
+        self._memory.unlink()
+
+    def search(self, position):
+        """Search the position with every worker and return a SearchResult"""
+        start = time.perf_counter()
+        self._stop.clear()
+        age = self.table.age
+        self.table.new_search()  # Matches the age each worker's Searcher will use
+        main_budget = {'max_time': self.max_time, 'max_nodes': self.max_nodes, 'max_depth': self.max_depth}
+        helper_budget = {'max_time': self.max_time}
+        futures = [self._pool.submit(_worker_search, position, worker_id, age,
+                                     main_budget if worker_id == 0 else helper_budget)
+                   for worker_id in range(self.workers)]
+        try:
+            # The main worker decides when the search is over
+            while not wait(futures[:1], timeout=0.01).done:
+                if self.stop_event is not None and self.stop_event.is_set():
+                    break
+        finally:
+            self._stop.set()
+            results = [future.result() for future in futures]
+
+        best = results[0]
+        for result in results[1:]:
+            if result.depth > best.depth and result.move is not None:
+                best = result
+        nodes = sum(result.nodes for result in results)
+        return SearchResult(best.move, best.score, best.depth, nodes, time.perf_counter() - start, best.pv,
+                            results[0].first_move_cutoff_rate)
@@ -0,0 +1,201 @@
+"""Streaming PGN reader and a parallel game validator.
+
+    python pgn.py games.pgn
+    python pgn.py games.pgn --workers 4 --chunk-size 200 --all > report.jsonl
+
+read_games parses one game at a time from any line iterator, so a file of
+any size is read with flat memory. validate_game replays a game's SAN moves
+through the rules engine and reports the first illegal move, along with
+the legal moves in SAN, or a result that contradicts the final position
+(a mate scored as a draw, say). The command sends chunks of games to a
+process pool, keeping only a few chunks in flight, writes a JSON line per
+bad game (per game with --all) and a summary with games/second to stderr.
+"""
+
+import argparse
+import itertools
+import json
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import START_FEN, Position, move_from_san, move_to_san
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+HEADER_PATTERN = re.compile(r'\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]')
+# Comments, variations and NAGs are skipped; whatever is left are move numbers, moves and results
+TOKEN_PATTERN = re.compile(r'\{[^}]*\}?|;.*|\(|\)|\$\d+|[^\s(){};]+')
+MOVE_NUMBER_PATTERN = re.compile(r'\d+\.+')
+
+
+class PgnGame:
+    def __init__(self, number, headers, moves, result):
+        self.number = number  # 1-based position in the file
+        self.headers = headers  # Tag pairs, e.g. {'White': ..., 'Result': '1-0'}
+        self.moves = moves  # SAN strings of the main line
+        self.result = result  # Game termination marker, or None if missing
+
+
+def read_games(lines):
+    """Yield a PgnGame for each game in a stream of PGN lines"""
+    number = 0
+    headers, moves = {}, []
+    depth = 0  # Variation nesting
+    in_comment = False
+    for line in lines:
+        stripped = line.strip()
+        if in_comment:
+            if '}' not in stripped:
+                continue
+            stripped = stripped[stripped.index('}') + 1:]
+            in_comment = False
+        if stripped.startswith('[') and depth == 0:
+            if moves:
+                # A tag section with no result token before it: the previous game ended
+                number += 1
+                yield PgnGame(number, headers, moves, None)
+                headers, moves = {}, []
+            match = HEADER_PATTERN.match(stripped)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+            continue
+        if stripped.startswith('%'):
+            continue  # Escape line
+        for token in TOKEN_PATTERN.findall(stripped):
+            if token[0] == '{':
+                in_comment = not token.endswith('}')
+            elif token == '(':
+                depth += 1
+            elif token == ')':
+                depth = max(depth - 1, 0)
+            elif depth or token[0] in ';$':
+                continue
+            elif token in RESULTS:
+                number += 1
+                yield PgnGame(number, headers, moves, token)
+                headers, moves = {}, []
+            else:
+                token = MOVE_NUMBER_PATTERN.sub('', token)
+                if token:
+                    moves.append(token)
+    if moves or headers:
+        number += 1
+        yield PgnGame(number, headers, moves, None)
+
+
+def validate_game(game):
+    """Replay a game and return a JSON-ready report, with 'ok' False and an error if it is broken"""
+    report = {
+        'game': game.number,
+        'white': game.headers.get('White'),
+        'black': game.headers.get('Black'),
+        'result': game.result,
+        'plies': 0,
+        'ok': True,
+    }
+    try:
+        _replay(game, report)
+    except Exception as error:  # One broken game must not end a whole archive run
+        report.update(ok=False, error=f"Cannot replay the game: {type(error).__name__}: {error}")
+    return report
+
+
+def _replay(game, report):
+    """Replay a game's moves and check its result, updating report"""
+    fen = game.headers.get('FEN', START_FEN)
+    try:
+        position = Position.from_fen(fen)
+    except ValueError as error:
+        report.update(ok=False, error=str(error))
+        return
+    for ply, san in enumerate(game.moves):
+        try:
+            move = move_from_san(position, san)
+        except ValueError as error:
+            report.update(ok=False, error=f"{error} at ply {ply + 1}", fen=position.to_fen(),
+                          legal_moves=[move_to_san(position, move) for move in position.legal_moves()])
+            return
+        position.make_move(move)
+        report['plies'] = ply + 1
+
+    tag_result = game.headers.get('Result')
+    final = position.game_result()
+    expected = {None: None, 'white': '1-0', 'black': '0-1', 'draw': '1/2-1/2'}[final]
+    if game.result is None:
+        report.update(ok=False, error='Missing game result')
+    elif tag_result is not None and tag_result != game.result:
+        report.update(ok=False, error=f"Result tag {tag_result} does not match the movetext result {game.result}")
+    elif expected is not None and game.result != expected:
+        report.update(ok=False, error=f"Game ends in {'stalemate' if final == 'draw' else 'checkmate'} "
+                                      f"but is scored {game.result}")
+
+
+def validate_games(games):
+    """validate_game for a chunk of games (runs in a pool worker)"""
+    return [validate_game(game) for game in games]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_stream(games, workers=1, chunk_size=100):
+    """Yield a report per game, in order, validating chunks on a process pool.
+
+    At most two chunks per worker are queued, so only those games are held
+    in memory however many the stream has.
+    """
+    if workers <= 1:
+        for game in games:
+            yield validate_game(game)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in _chunks(games, chunk_size):
+            pending.append(pool.submit(validate_games, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help="PGN file ('-' for stdin)")
+    parser.add_argument('--workers', type=int, default=1, help='processes to validate games on')
+    parser.add_argument('--chunk-size', type=int, default=100, help='games sent to a worker at a time')
+    parser.add_argument('--all', action='store_true', help='report every game, not just the broken ones')
+    args = parser.parse_args(argv)
+
+    stream = sys.stdin if args.path == '-' else open(args.path, encoding='utf-8', errors='replace')
+    start = time.perf_counter()
+    games = invalid = plies = 0
+    try:
+        for report in validate_stream(read_games(stream), args.workers, args.chunk_size):
+            games += 1
+            plies += report['plies']
+            if not report['ok']:
+                invalid += 1
+            if args.all or not report['ok']:
+                sys.stdout.write(json.dumps(report) + '\n')
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    seconds = time.perf_counter() - start
+    json.dump({'games': games, 'invalid': invalid, 'plies': plies, 'workers': args.workers,
+               'seconds': round(seconds, 4),
+               'games_per_second': round(games / seconds, 1) if seconds > 0 else None}, sys.stderr)
+    print(file=sys.stderr)
+    return 1 if invalid else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
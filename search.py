@@ -0,0 +1,431 @@
+"""Alpha-beta search for the AI.
+
+Searcher runs a negamax alpha-beta search with iterative deepening: it
+searches depth 1, 2, 3, ... and keeps the best move of the deepest
+iteration that finished. Leaf positions are resolved by a quiescence
+search over captures so the score is not taken in the middle of an
+exchange, and scored by the incremental evaluation in evaluation.py. A
+time and/or node budget stops the search, and the best move found so far
+is always returned.
+
+Moves are searched in the order most likely to cause a cutoff: the hash
+move, then captures by MVV-LVA (most valuable victim, least valuable
+attacker), then the two killer moves of the ply, then quiet moves by
+their history score.
+
+Given tablebases, positions with three pieces or fewer are not searched
+but scored exactly from the tables.
+
+static_exchange works out what a capture wins once both sides have
+recaptured on its square, without making any moves. The quiescence
+search skips captures that lose material by it.
+"""
+
+import time
+
+from engine import (BOARD_SIZE, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, SLIDER_RAYS, opposite_color,
+                    square_index)
+from evaluation import KING_ZONE_WEIGHTS, MOBILITY_WEIGHTS, tapered_score
+from tt import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable
+
+# Move ordering only; the evaluation uses evaluation.py
+PIECE_VALUES = {'pawn': 100, 'knight': 320, 'bishop': 330, 'rook': 500, 'queen': 900, 'king': 0}
+KING_VALUE = 20000  # The king as a capturer in static_exchange: more than everything else together
+KING_ZONES = [(square,) + tuple(targets) for square, targets in enumerate(KING_ATTACKS)]
+
+MATE_SCORE = 100000
+MATE_BOUND = MATE_SCORE - 1000  # Scores beyond this are mates
+INFINITY = 1000000
+
+CHECK_EVERY = 1024  # Nodes between clock/stop checks
+
+# Move ordering bands; history scores stay below KILLER_SCORE
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28
+KILLER_SCORE = 1 << 26
+HISTORY_LIMIT = KILLER_SCORE - 1
+
+
+def evaluate(position):
+    """Tapered score from the side to move's point of view.
+
+    Material and piece-square sums are maintained by make_move/unmake_move,
+    and mobility and king safety are read from the attack maps, so this
+    never looks at the pieces.
+    """
+    white_attacks = position.attacks['white']
+    black_attacks = position.attacks['black']
+    mobility = sum(white_attacks) - sum(black_attacks)
+    kings = position.kings
+    king_danger = 0  # Enemy attacks around black's king minus those around white's
+    if 'white' in kings:
+        king = kings['white']
+        king_danger -= sum(map(black_attacks.__getitem__, KING_ZONES[king.row * BOARD_SIZE + king.col]))
+    if 'black' in kings:
+        king = kings['black']
+        king_danger += sum(map(white_attacks.__getitem__, KING_ZONES[king.row * BOARD_SIZE + king.col]))
+    middlegame = position.middlegame_score + MOBILITY_WEIGHTS[0] * mobility + KING_ZONE_WEIGHTS[0] * king_danger
+    endgame = position.endgame_score + MOBILITY_WEIGHTS[1] * mobility + KING_ZONE_WEIGHTS[1] * king_danger
+    score = tapered_score(middlegame, endgame, position.phase)
+    return score if position.current_turn == 'white' else -score
+
+
+def is_capture(position, move):
+    """Does the move capture (including en passant) or promote?"""
+    from_row, from_col, to_row, to_col, promotion = move
+    if promotion is not None or position.board[to_row * BOARD_SIZE + to_col] is not None:
+        return True
+    return (to_row, to_col) == position.en_passant and position.board[from_row * BOARD_SIZE + from_col].piece_type == 'pawn'
+
+
+def capture_score(position, move):
+    """MVV-LVA key of a capture or promotion: best victim first, cheapest attacker first"""
+    from_row, from_col, to_row, to_col, promotion = move
+    board = position.board
+    victim = board[to_row * BOARD_SIZE + to_col]
+    victim_value = PIECE_VALUES[victim.piece_type] if victim is not None else PIECE_VALUES['pawn']
+    if promotion is not None:
+        victim_value += PIECE_VALUES[promotion]
+    return victim_value * 16 - PIECE_VALUES[board[from_row * BOARD_SIZE + from_col].piece_type] // 100
+
+
+def _least_valuable_attacker(position, square, color, removed):
+    """(square, value) of color's cheapest piece attacking square, seeing through removed squares, or None"""
+    board = position.board
+    for attacker_type, squares in (('pawn', PAWN_ATTACKS[opposite_color(color)][square]),
+                                   ('knight', KNIGHT_ATTACKS[square])):
+        for attacker_square in squares:
+            piece = board[attacker_square]
+            if (piece is not None and piece.color == color and piece.piece_type == attacker_type
+                    and attacker_square not in removed):
+                return attacker_square, PIECE_VALUES[attacker_type]
+    best = None
+    for rays, sliders in ((SLIDER_RAYS['bishop'][square], ('bishop', 'queen')),
+                          (SLIDER_RAYS['rook'][square], ('rook', 'queen'))):
+        for ray in rays:
+            for attacker_square in ray:
+                piece = board[attacker_square]
+                if piece is None or attacker_square in removed:
+                    continue
+                if piece.color == color and piece.piece_type in sliders:
+                    value = PIECE_VALUES[piece.piece_type]
+                    if best is None or value < best[1]:
+                        best = attacker_square, value
+                break
+    if best is not None:
+        return best
+    for attacker_square in KING_ATTACKS[square]:
+        piece = board[attacker_square]
+        if piece is not None and piece.color == color and piece.piece_type == 'king' and attacker_square not in removed:
+            return attacker_square, KING_VALUE
+    return None
+
+
+def _exchange_gain(position, square, victim_value, color, removed):
+    """Material color wins by capturing on square, then recapturing while it pays (0 if it should not start)"""
+    attacker = _least_valuable_attacker(position, square, color, removed)
+    if attacker is None:
+        return 0
+    attacker_square, attacker_value = attacker
+    removed = removed | {attacker_square}
+    if attacker_value == KING_VALUE and _least_valuable_attacker(position, square, opposite_color(color), removed):
+        return 0  # The king may not capture onto a defended square
+    return max(0, victim_value - _exchange_gain(position, square, attacker_value, opposite_color(color), removed))
+
+
+def static_exchange(position, move):
+    """Material the side to move nets by a move once both sides have captured back on its target square.
+
+    Captures go cheapest attacker first and each side stops when going on
+    would lose; x-ray attackers behind a capturing piece join in. Pins
+    are ignored and no move is made on the board. A quiet move scores 0,
+    or minus the material it hangs.
+    """
+    from_row, from_col, to_row, to_col, promotion = move
+    board = position.board
+    piece = board[from_row * BOARD_SIZE + from_col]
+    to_square = square_index(to_row, to_col)
+    removed = {square_index(from_row, from_col)}
+    victim = board[to_square]
+    victim_value = PIECE_VALUES[victim.piece_type] if victim is not None else 0
+    if piece.piece_type == 'pawn' and victim is None and from_col != to_col:
+        victim_value = PIECE_VALUES['pawn']  # En passant
+        removed.add(square_index(from_row, to_col))
+    mover_value = PIECE_VALUES[piece.piece_type] if piece.piece_type != 'king' else KING_VALUE
+    if promotion is not None:
+        victim_value += PIECE_VALUES[promotion] - PIECE_VALUES['pawn']
+        mover_value = PIECE_VALUES[promotion]
+    return victim_value - _exchange_gain(position, to_square, mover_value, opposite_color(piece.color), removed)
+
+
+def _score_to_table(score, ply):
+    """Store mate scores relative to the node, not the root"""
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class SearchAborted(Exception):
+    """Raised inside the search when the budget runs out"""
+
+
+class SearchResult:
+    def __init__(self, move, score, depth, nodes, seconds, pv, first_move_cutoff_rate=None):
+        self.move = move  # Best move, or None if there is no legal move
+        self.score = score  # Centipawns from the side to move's point of view
+        self.depth = depth  # Deepest completed iteration
+        self.nodes = nodes
+        self.seconds = seconds
+        self.pv = pv  # Expected line of play, starting with move
+        self.first_move_cutoff_rate = first_move_cutoff_rate  # Share of beta cutoffs on the first move
+
+    @property
+    def nodes_per_second(self):
+        return int(self.nodes / self.seconds) if self.seconds > 0 else 0
+
+
+class Searcher:
+    """Iterative deepening alpha-beta search within a time/node budget"""
+
+    def __init__(self, table=None, max_time=None, max_nodes=None, max_depth=64, stop_event=None,
+                 move_ordering=True, depth_offset=0, tablebases=None):
+        self.table = table if table is not None else TranspositionTable()
+        self.max_time = max_time  # Seconds per move, or None
+        self.max_nodes = max_nodes  # Nodes per move, or None
+        self.max_depth = max_depth
+        self.stop_event = stop_event  # threading.Event to abort from outside
+        self.move_ordering = move_ordering  # Off only to measure what ordering buys
+        self.depth_offset = depth_offset  # Extra plies per iteration (Lazy SMP helpers)
+        self.tablebases = tablebases  # tablebase.Tablebases for exact endgame scores, or None
+        self.nodes = 0
+        self.killers = []  # Per ply: up to two quiet moves that caused a cutoff
+        self.history = {}  # (color, from_row, from_col, to_row, to_col) -> cutoff score
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self._deadline = None
+        self._next_check = CHECK_EVERY
+
+    @property
+    def first_move_cutoff_rate(self):
+        """Share of beta cutoffs produced by the first move searched"""
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else None
+
+    def _order_moves(self, position, moves, hash_move, ply):
+        """Sort moves so the likeliest cutoff comes first"""
+        if not self.move_ordering:
+            return moves
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history
+        color = position.current_turn
+        scores = {}
+        for move in moves:
+            if move == hash_move:
+                scores[move] = HASH_MOVE_SCORE
+            elif is_capture(position, move):
+                scores[move] = CAPTURE_SCORE + capture_score(position, move)
+            elif move in killers:
+                scores[move] = KILLER_SCORE + 1 - killers.index(move)
+            else:
+                scores[move] = history.get((color,) + move[:4], 0)
+        moves.sort(key=scores.__getitem__, reverse=True)
+        return moves
+
+    def _record_cutoff(self, position, move, depth, ply, move_number):
+        """Update counters, killers and history after a beta cutoff"""
+        self.beta_cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+        if is_capture(position, move):
+            return
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        key = (position.current_turn,) + move[:4]
+        self.history[key] = min(self.history.get(key, 0) + depth * depth, HISTORY_LIMIT)
+
+    def _check_budget(self):
+        """Abort the search when the budget is spent or a stop is requested"""
+        self._next_check = self.nodes + CHECK_EVERY
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchAborted
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchAborted
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchAborted
+
+    def search(self, position):
+        """Search the position and return a SearchResult"""
+        start = time.perf_counter()
+        self.nodes = 0
+        self.killers = []
+        self.history = {}
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self._next_check = CHECK_EVERY
+        self._deadline = start + self.max_time if self.max_time is not None else None
+        self.table.new_search()
+
+        root_moves = position.legal_moves()
+        if not root_moves:
+            score = -MATE_SCORE if position.is_in_check(position.current_turn) else 0
+            return SearchResult(None, score, 0, 0, 0.0, [])
+        entry = self.table.probe(position.hash_key)
+        self._order_moves(position, root_moves, entry[0] if entry is not None else None, 0)
+        best_move, best_score, completed_depth = root_moves[0], 0, 0
+
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score, move = self._search_root(position, root_moves, depth + self.depth_offset)
+            except SearchAborted:
+                break
+            best_move, best_score, completed_depth = move, score, depth + self.depth_offset
+            # Search the best move first in the next iteration
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+            if abs(score) > MATE_BOUND or len(root_moves) == 1:
+                break
+            # Another iteration costs several times this one; don't start what can't finish
+            if self._deadline is not None and time.perf_counter() - start > (self._deadline - start) / 2:
+                break
+
+        return SearchResult(best_move, best_score, completed_depth, self.nodes, time.perf_counter() - start,
+                            self._principal_variation(position, best_move), self.first_move_cutoff_rate)
+
+    def _search_root(self, position, moves, depth):
+        """Search every root move and return (score, best move)"""
+        alpha, beta = -INFINITY, INFINITY
+        best_move = moves[0]
+        for move in moves:
+            position.make_move(move)
+            try:
+                score = -self._negamax(position, depth - 1, -beta, -alpha, 1)
+            finally:
+                position.unmake_move()
+            if score > alpha:
+                alpha, best_move = score, move
+        self.table.store(position.hash_key, best_move, alpha, depth, EXACT)
+        return alpha, best_move
+
+    def _is_draw(self, position):
+        """Fifty-move rule or a repetition since the last irreversible move"""
+        return position.halfmove_clock >= 100 or position.is_repetition()
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+        """Score of the position for the side to move, searched depth plies deep"""
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check_budget()
+        if self._is_draw(position):
+            return 0
+        if self.tablebases is not None and len(position.pieces) <= 3:
+            found = self.tablebases.probe(position)
+            if found is not None:
+                outcome, plies = found
+                if outcome == 'draw':
+                    return 0
+                return MATE_SCORE - ply - plies if outcome == 'win' else -MATE_SCORE + ply + plies
+        if depth <= 0:
+            return self._quiescence(position, alpha, beta, ply)
+
+        key = position.hash_key
+        entry = self.table.probe(key)
+        hash_move = None
+        if entry is not None:
+            hash_move, entry_score, entry_depth, flag = entry
+            if entry_depth >= depth:
+                entry_score = _score_from_table(entry_score, ply)
+                if flag == EXACT:
+                    return entry_score
+                if flag == LOWER_BOUND and entry_score >= beta:
+                    return entry_score
+                if flag == UPPER_BOUND and entry_score <= alpha:
+                    return entry_score
+
+        moves = list(position.iter_legal_moves())  # Not legal_moves: inner nodes are seldom revisited
+        if not moves:
+            return -MATE_SCORE + ply if position.is_in_check(position.current_turn) else 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        for move_number, move in enumerate(self._order_moves(position, moves, hash_move, ply)):
+            position.make_move(move)
+            try:
+                score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                position.unmake_move()
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self._record_cutoff(position, move, depth, ply, move_number)
+                        break
+
+        if best_score >= beta:
+            flag = LOWER_BOUND
+        elif best_score > original_alpha:
+            flag = EXACT
+        else:
+            flag = UPPER_BOUND
+        self.table.store(key, best_move, _score_to_table(best_score, ply), depth, flag)
+        return best_score
+
+    def _quiescence(self, position, alpha, beta, ply):
+        """Search captures only until the position is quiet"""
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check_budget()
+
+        stand_pat = evaluate(position)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        # Captures that lose material by static exchange cannot raise alpha above the stand-pat score
+        captures = [move for move in position.iter_legal_moves()
+                    if is_capture(position, move) and static_exchange(position, move) >= 0]
+        if self.move_ordering:
+            captures.sort(key=lambda move: capture_score(position, move), reverse=True)
+        for move in captures:
+            position.make_move(move)
+            try:
+                score = -self._quiescence(position, -beta, -alpha, ply + 1)
+            finally:
+                position.unmake_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _principal_variation(self, position, first_move, max_length=16):
+        """Follow stored best moves from the root to recover the expected line"""
+        pv = []
+        move = first_move
+        seen = set()
+        while move is not None and len(pv) < max_length and position.hash_key not in seen:
+            if move not in position.legal_moves():
+                break
+            seen.add(position.hash_key)
+            pv.append(move)
+            position.make_move(move)
+            entry = self.table.probe(position.hash_key)
+            move = entry[0] if entry is not None else None
+        for _ in pv:
+            position.unmake_move()
+        return pv
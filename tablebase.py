@@ -0,0 +1,358 @@
+"""Endgame tablebases for king and one piece against a lone king.
+
+    python tablebase.py generate                  # KQK KRK KBK KNK KPK into tablebases/
+    python tablebase.py generate KQK KRK --out /tmp/tb
+    python tablebase.py probe --fen "8/8/8/4k3/8/8/8/KQ6 w - - 0 1"
+
+Tables are built by retrograde analysis: start from the checkmates and
+walk moves backwards, so every position is visited a handful of times
+instead of being searched. Each table is one byte per position in an
+array, indexed by a perfect index of the position:
+
+    index = side << 18 | strong king << 12 | weak king << 6 | piece
+
+with squares numbered row * 8 + col and side 0 when the side with the
+extra piece is to move. The byte is 0 for a draw, ILLEGAL for a position
+that cannot occur, else the distance to mate in plies plus one (odd
+distances are wins for the side to move, even ones losses). Tables with
+the extra piece on black's side are looked up with the board mirrored.
+Files are the raw arrays, so Tablebases maps them with mmap and probes
+are a single byte read. Castling rights are ignored.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+
+from engine import (DIAGONAL_RAYS, KING_TARGETS, KNIGHT_TARGETS, PIECE_LETTERS, PROMOTION_TYPES,
+                    STRAIGHT_RAYS, Position, move_to_uci)
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases')
+
+TABLE_SIZE = 2 * 64 * 64 * 64
+ILLEGAL = 0xFF
+DRAW = 0
+BLOCKED = 0xFF  # Move counter of a position the weak side can always draw
+
+# Table name -> extra piece; KPK needs the others first for promotions
+TABLES = {'KQK': 'queen', 'KRK': 'rook', 'KBK': 'bishop', 'KNK': 'knight', 'KPK': 'pawn'}
+
+
+def _squares(targets):
+    return [[row * 8 + col for row, col in squares] for squares in targets]
+
+
+def _ray_squares(rays):
+    return [[[row * 8 + col for row, col in ray] for ray in square_rays] for square_rays in rays]
+
+
+KING_SQUARES = _squares(KING_TARGETS)
+KNIGHT_SQUARES = _squares(KNIGHT_TARGETS)
+PIECE_RAYS = {
+    'queen': [straight + diagonal for straight, diagonal in
+              zip(_ray_squares(STRAIGHT_RAYS), _ray_squares(DIAGONAL_RAYS))],
+    'rook': _ray_squares(STRAIGHT_RAYS),
+    'bishop': _ray_squares(DIAGONAL_RAYS),
+}
+KING_ADJACENT = [set(squares) for squares in KING_SQUARES]
+
+
+def table_index(side, strong_king, weak_king, piece):
+    return side << 18 | strong_king << 12 | weak_king << 6 | piece
+
+
+def _piece_attacks(piece_type, piece, target, blocker):
+    """Does the strong side's extra piece on square piece attack target, with one blocker on the board?"""
+    if piece_type == 'knight':
+        return target in KNIGHT_SQUARES[piece]
+    if piece_type == 'pawn':
+        # The strong side's pawns move towards row 0
+        return target // 8 == piece // 8 - 1 and abs(target % 8 - piece % 8) == 1
+    for ray in PIECE_RAYS[piece_type][piece]:
+        for square in ray:
+            if square == target:
+                return True
+            if square == blocker:
+                break
+    return False
+
+
+def _piece_targets(piece_type, piece, occupied):
+    """Squares the extra piece can move to, occupied squares blocking (no captures: the weak side has only a king)"""
+    if piece_type == 'knight':
+        return [square for square in KNIGHT_SQUARES[piece] if square not in occupied]
+    targets = []
+    for ray in PIECE_RAYS[piece_type][piece]:
+        for square in ray:
+            if square in occupied:
+                break
+            targets.append(square)
+    return targets
+
+
+def _is_legal(side, strong_king, weak_king, piece, piece_type):
+    """Could the position occur in a game?"""
+    if len({strong_king, weak_king, piece}) < 3 or weak_king in KING_ADJACENT[strong_king]:
+        return False
+    if piece_type == 'pawn' and piece // 8 in (0, 7):
+        return False
+    # The weak king cannot be in check with the strong side to move
+    return side == 1 or not _piece_attacks(piece_type, piece, weak_king, strong_king)
+
+
+def _weak_king_moves(strong_king, weak_king, piece, piece_type):
+    """(legal target squares of the lone king, whether one of them captures the piece)"""
+    targets = []
+    can_capture = False
+    for square in KING_SQUARES[weak_king]:
+        if square == strong_king or square in KING_ADJACENT[strong_king]:
+            continue
+        if square == piece:
+            can_capture = True  # The piece is not defended: the strong king is not next to it
+        elif not _piece_attacks(piece_type, piece, square, strong_king):
+            targets.append(square)
+    return targets, can_capture
+
+
+def generate_table(piece_type, promotion_tables=None):
+    """Build the table for king and piece_type against king.
+
+    promotion_tables maps piece types to finished tables, for KPK.
+    """
+    values = array('B', bytes(TABLE_SIZE))
+    counters = array('B', bytes(TABLE_SIZE // 2))  # Weak side to move: moves not yet known to lose
+    buckets = [[]]  # Plies to mate -> positions that may be resolved at that distance
+
+    for strong_king in range(64):
+        for weak_king in range(64):
+            for piece in range(64):
+                for side in (0, 1):
+                    if not _is_legal(side, strong_king, weak_king, piece, piece_type):
+                        values[table_index(side, strong_king, weak_king, piece)] = ILLEGAL
+                index = table_index(1, strong_king, weak_king, piece) & (TABLE_SIZE // 2 - 1)
+                if values[index | 1 << 18] == ILLEGAL:
+                    continue
+                targets, can_capture = _weak_king_moves(strong_king, weak_king, piece, piece_type)
+                if can_capture:
+                    counters[index] = BLOCKED
+                elif targets:
+                    counters[index] = len(targets)
+                elif _piece_attacks(piece_type, piece, weak_king, strong_king):
+                    buckets[0].append(index | 1 << 18)  # Checkmate
+                # Else stalemate: stays a draw
+
+    if piece_type == 'pawn':
+        # Promotions lead into the other tables
+        for strong_king in range(64):
+            for weak_king in range(64):
+                for piece in range(8, 16):
+                    index = table_index(0, strong_king, weak_king, piece)
+                    target = piece - 8
+                    if values[index] == ILLEGAL or target in (strong_king, weak_king):
+                        continue
+                    for promotion in PROMOTION_TYPES:
+                        value = promotion_tables[promotion][table_index(1, strong_king, weak_king, target)]
+                        if value not in (DRAW, ILLEGAL):
+                            plies = value  # value - 1 plies to mate after the promotion, plus the promotion
+                            while len(buckets) <= plies:
+                                buckets.append([])
+                            buckets[plies].append(index)
+
+    plies = 0
+    while plies < len(buckets):
+        for index in buckets[plies]:
+            if values[index]:
+                continue  # Already resolved closer to mate
+            values[index] = plies + 1
+            side, strong_king, weak_king, piece = index >> 18, index >> 12 & 63, index >> 6 & 63, index & 63
+            found = []
+            if side == 1:
+                # Lost for the weak side: every strong move into it wins
+                for square in KING_SQUARES[strong_king]:
+                    if square != piece and square != weak_king and square not in KING_ADJACENT[weak_king]:
+                        found.append(table_index(0, square, weak_king, piece))
+                if piece_type == 'pawn':
+                    if piece // 8 < 6 and piece + 8 not in (strong_king, weak_king):
+                        found.append(table_index(0, strong_king, weak_king, piece + 8))
+                        if piece // 8 == 4 and piece + 16 not in (strong_king, weak_king):
+                            found.append(table_index(0, strong_king, weak_king, piece + 16))
+                else:
+                    # Piece moves are reversible: step back along the same lines
+                    for square in _piece_targets(piece_type, piece, (strong_king, weak_king)):
+                        found.append(table_index(0, strong_king, weak_king, square))
+                for predecessor in found:
+                    if not values[predecessor]:
+                        while len(buckets) <= plies + 1:
+                            buckets.append([])
+                        buckets[plies + 1].append(predecessor)
+            else:
+                # Won for the strong side: one more weak move known to lose
+                for square in KING_SQUARES[weak_king]:
+                    if square == strong_king or square == piece or square in KING_ADJACENT[strong_king]:
+                        continue
+                    predecessor = table_index(1, strong_king, square, piece)
+                    counter = predecessor & (TABLE_SIZE // 2 - 1)
+                    if values[predecessor] or counters[counter] in (0, BLOCKED):
+                        continue
+                    counters[counter] -= 1
+                    if not counters[counter]:
+                        while len(buckets) <= plies + 1:
+                            buckets.append([])
+                        buckets[plies + 1].append(predecessor)
+        buckets[plies] = None  # Free each level once done
+        plies += 1
+    return values
+
+
+def generate(names, directory=DEFAULT_DIRECTORY):
+    """Generate the named tables (and the ones they depend on) into directory"""
+    os.makedirs(directory, exist_ok=True)
+    if 'KPK' in names:
+        names = [name for name in TABLES if name != 'KPK' and name not in names] + list(names)
+    tables = {}
+    report = []
+    for name in sorted(names, key=list(TABLES).index):
+        start = time.perf_counter()
+        piece_type = TABLES[name]
+        values = generate_table(piece_type, tables)
+        tables[piece_type] = values
+        with open(os.path.join(directory, name + '.bin'), 'wb') as table_file:
+            values.tofile(table_file)
+        legal = [value for value in values if value != ILLEGAL]
+        report.append({'table': name, 'seconds': round(time.perf_counter() - start, 2),
+                       'positions': len(legal), 'draws': legal.count(DRAW),
+                       'longest_mate_plies': max(legal) - 1 if any(legal) else None})
+    return report
+
+
+class Tablebases:
+    """Memory-mapped tables from a directory, loaded on first use"""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self._maps = {}  # Table name -> mmap, or None if there is no file
+        self._has_wins = {}
+
+    def close(self):
+        for table in self._maps.values():
+            if table is not None:
+                table.close()
+        self._maps = {}
+
+    def _table(self, name):
+        if name not in self._maps:
+            path = os.path.join(self.directory, name + '.bin')
+            table = None
+            if os.path.exists(path) and os.path.getsize(path) == TABLE_SIZE:
+                with open(path, 'rb') as table_file:
+                    table = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[name] = table
+        return self._maps[name]
+
+    def _lookup(self, position):
+        """(table, index) for the position, (None, None) for bare kings, or None if not covered"""
+        pieces = position.pieces
+        if len(pieces) == 2:
+            return None, None
+        if len(pieces) != 3:
+            return None
+        extra = next(piece for piece in pieces if piece.piece_type != 'king')
+        strong, weak = position.kings[extra.color], position.kings['black' if extra.color == 'white' else 'white']
+        table = self._table('K' + PIECE_LETTERS[extra.piece_type].upper() + 'K')
+        if table is None:
+            return None
+
+        def square(piece):
+            # Mirror rows so the strong side always plays up the board
+            return (piece.row if extra.color == 'white' else 7 - piece.row) * 8 + piece.col
+
+        side = 0 if position.current_turn == extra.color else 1
+        return table, table_index(side, square(strong), square(weak), square(extra))
+
+    def probe(self, position):
+        """('win' | 'loss' | 'draw', plies to mate) for the side to move, or None if not covered"""
+        found = self._lookup(position)
+        if found is None:
+            return None
+        table, index = found
+        if table is None:
+            return 'draw', 0  # Bare kings
+        value = table[index]
+        if value in (DRAW, ILLEGAL):
+            return 'draw', 0
+        plies = value - 1
+        return ('win' if plies % 2 else 'loss'), plies
+
+    def is_dead_draw(self, position):
+        """True if neither side can ever mate, e.g. bare kings or king and knight against king"""
+        found = self._lookup(position)
+        if found is None:
+            return False
+        table, _ = found
+        if table is None:
+            return True
+        if table not in self._has_wins:
+            # Any byte that is neither DRAW nor ILLEGAL is a mate distance
+            self._has_wins[table] = bool(table[:].translate(None, bytes([DRAW, ILLEGAL])))
+        return not self._has_wins[table]
+
+    def best_move(self, position):
+        """The move that mates fastest, holds the draw, or resists longest; None if not covered"""
+        if self.probe(position) is None:
+            return None
+        best_move, best_key = None, None
+        for move in position.legal_moves():
+            position.make_move(move)
+            reply = self.probe(position)
+            position.unmake_move()
+            if reply is None:
+                continue
+            outcome, plies = reply
+            # Rank by our outcome after the move: opponent's loss first, then shortest mate / longest defence
+            key = {'loss': (2, -plies), 'draw': (1, 0), 'win': (0, plies)}[outcome]
+            if best_key is None or key > best_key:
+                best_move, best_key = move, key
+        return best_move
+
+
+def generate_command(args):
+    names = args.tables or list(TABLES)
+    unknown = [name for name in names if name not in TABLES]
+    if unknown:
+        raise SystemExit(f"Unknown tables: {', '.join(unknown)} (choose from {', '.join(TABLES)})")
+    return {'command': 'generate', 'directory': args.out, 'tables': generate(names, args.out)}
+
+
+def probe_command(args):
+    position = Position.from_fen(args.fen)
+    tablebases = Tablebases(args.out)
+    result = tablebases.probe(position)
+    move = tablebases.best_move(position)
+    tablebases.close()
+    return {'command': 'probe', 'fen': args.fen, 'covered': result is not None,
+            'outcome': result and result[0], 'plies_to_mate': result and result[1],
+            'best_move': move_to_uci(move) if move else None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', default=DEFAULT_DIRECTORY, help='table directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate_parser = commands.add_parser('generate', help='build tables by retrograde analysis')
+    generate_parser.add_argument('tables', nargs='*', help=f"tables to build (default: {' '.join(TABLES)})")
+    probe_parser = commands.add_parser('probe', help='look up a position')
+    probe_parser.add_argument('--fen', required=True, help='position with at most three pieces')
+
+    args = parser.parse_args(argv)
+    report = generate_command(args) if args.command == 'generate' else probe_command(args)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""Headless AI-vs-AI matches on a process pool, with Elo and SPRT reporting.
+
+    python tournament.py medium easy --games 200 --workers 4
+    python tournament.py "medium:max_nodes=4000" "medium:max_nodes=2000" --games 1000
+    python tournament.py hard medium --games 20000 --sprt 0 10 > games.jsonl
+
+Each engine is a level from ai.LEVELS, optionally with its search budget
+overridden as level:key=value,... (max_depth, max_nodes, max_time). Games
+start from short random openings, each played twice with colors swapped,
+so neither engine gets the better side of an opening. Games end by the
+rules (mate, stalemate, fifty moves, threefold repetition, no mating
+material), by tablebase adjudication when tables are available, or as a
+draw after --max-plies.
+
+A JSON line is written per game and a summary to stderr: games/second,
+wins/draws/losses from the first engine's side, the Elo difference with
+its 95% confidence interval and, with --sprt, the log-likelihood ratio of
+the sequential probability ratio test. The match stops as soon as the
+SPRT accepts either hypothesis.
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from ai import (DEFAULT_BOOK_PATH, DEFAULT_TABLEBASE_DIRECTORY, LEVELS, choose_ai_move, open_book,
+                open_tablebases)
+from engine import move_to_uci, new_game, opposite_color
+from search import Searcher
+from tt import DEFAULT_MEGABYTES, TranspositionTable
+
+BUDGET_KEYS = {'max_depth': int, 'max_nodes': int, 'max_time': float}
+
+_book = None  # Process state, set by _init_worker
+_tablebases = None
+_table_megabytes = DEFAULT_MEGABYTES
+
+
+def parse_engine(text):
+    """(level, budget overrides) from 'level' or 'level:key=value,...'"""
+    level, _, options = text.partition(':')
+    if level not in LEVELS:
+        raise ValueError(f"Unknown level {level!r} (choose from {', '.join(LEVELS)})")
+    overrides = {}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        if key not in BUDGET_KEYS or not value:
+            raise ValueError(f"Invalid engine option {option!r} (use {', '.join(BUDGET_KEYS)})")
+        overrides[key] = BUDGET_KEYS[key](value)
+    if overrides and LEVELS[level] is None:
+        raise ValueError(f"Level {level!r} does not search, so it takes no options")
+    return level, overrides
+
+
+def random_opening(rng, plies):
+    """A list of random moves from the start position that does not end the game"""
+    while True:
+        position = new_game()
+        moves = []
+        for _ in range(plies):
+            legal = position.legal_moves()
+            if not legal:
+                break
+            moves.append(rng.choice(legal))
+            position.make_move(moves[-1])
+        if len(moves) == plies and position.game_result() is None:
+            return moves
+
+
+def _init_worker(book_path, tablebase_directory, table_megabytes=DEFAULT_MEGABYTES):
+    """Open the book and tablebases once per process and set the engines' table size"""
+    global _book, _tablebases, _table_megabytes
+    _book = open_book(book_path)
+    _tablebases = open_tablebases(tablebase_directory)
+    _table_megabytes = table_megabytes
+
+
+def adjudicate(position, max_plies):
+    """(result, reason) once the game is over, else (None, None)"""
+    result = position.game_result()
+    if result is not None:
+        if result == 'draw':
+            return '1/2-1/2', 'stalemate'
+        return ('1-0' if result == 'white' else '0-1'), 'checkmate'
+    if position.halfmove_clock >= 100:
+        return '1/2-1/2', 'fifty moves'
+    if position.is_repetition(3):
+        return '1/2-1/2', 'repetition'
+    if len(position.pieces) == 2 or (_tablebases is not None and _tablebases.is_dead_draw(position)):
+        return '1/2-1/2', 'insufficient material'
+    found = _tablebases.probe(position) if _tablebases is not None else None
+    if found is not None:
+        outcome, _ = found
+        if outcome == 'draw':
+            return '1/2-1/2', 'tablebase'
+        winner = position.current_turn if outcome == 'win' else opposite_color(position.current_turn)
+        return ('1-0' if winner == 'white' else '0-1'), 'tablebase'
+    if len(position.history) >= max_plies:
+        return '1/2-1/2', 'move limit'
+    return None, None
+
+
+def play_game(number, opening, white, black, max_plies):
+    """Play one game between two (level, overrides) engines and return a JSON-ready dict"""
+    start = time.perf_counter()
+    players = {}
+    for color, (level, overrides) in (('white', white), ('black', black)):
+        budget = LEVELS[level]
+        searcher = None
+        if budget is not None:
+            searcher = Searcher(TranspositionTable(_table_megabytes), tablebases=_tablebases,
+                                **dict(budget, **overrides))
+        players[color] = (level, searcher)
+    position = new_game()
+    for move in opening:
+        position.make_move(move)
+    moves = []
+    while True:
+        result, reason = adjudicate(position, max_plies)
+        if result is not None:
+            break
+        level, searcher = players[position.current_turn]
+        move = choose_ai_move(position, level, searcher=searcher, book=_book, tablebases=_tablebases)
+        position.make_move(move)
+        moves.append(move_to_uci(move))
+    return {'game': number, 'result': result, 'reason': reason, 'plies': len(moves),
+            'opening': [move_to_uci(move) for move in opening], 'moves': moves,
+            'seconds': round(time.perf_counter() - start, 3)}
+
+
+def expected_score(elo):
+    """Expected score of a player rated elo points above the opponent"""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_to_elo(score):
+    """Inverse of expected_score; None for a score of 0 or 1"""
+    if not 0 < score < 1:
+        return None
+    return -400 * math.log10(1 / score - 1)
+
+
+def _score_stats(wins, draws, losses):
+    """(games, mean score, per-game score variance)"""
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    return games, score, variance
+
+
+def elo_interval(wins, draws, losses, z=1.96):
+    """(Elo difference, lower bound, upper bound), None where undefined, at confidence z"""
+    games, score, variance = _score_stats(wins, draws, losses)
+    margin = z * math.sqrt(variance / games)
+    return score_to_elo(score), score_to_elo(score - margin), score_to_elo(score + margin)
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """Log-likelihood ratio of H1 (Elo = elo1) against H0 (Elo = elo0), normal approximation"""
+    if not (wins and draws and losses):
+        # Half a game of each outcome keeps the variance above zero in one-sided matches
+        wins, draws, losses = wins + 0.5, draws + 0.5, losses + 0.5
+    games, score, variance = _score_stats(wins, draws, losses)
+    score0, score1 = expected_score(elo0), expected_score(elo1)
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def sprt_bounds(alpha, beta):
+    """(lower, upper) LLR bounds: below accepts H0, above accepts H1"""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def schedule(engines, games, plies, seed):
+    """(number, opening, white, black) per game: each opening twice, colors swapped"""
+    rng = random.Random(seed)
+    first, second = engines
+    for number in range(games):
+        if number % 2 == 0:
+            opening = random_opening(rng, plies)
+        yield (number + 1, opening) + ((first, second) if number % 2 == 0 else (second, first))
+
+
+def run_match(engines, games, workers=1, plies=4, seed=0, max_plies=400, book_path=None,
+              tablebase_directory=None, table_megabytes=DEFAULT_MEGABYTES):
+    """Yield (game report, first engine's score) as games finish, at most two per worker in flight"""
+    jobs = schedule(engines, games, plies, seed)
+    if workers <= 1:
+        _init_worker(book_path, tablebase_directory, table_megabytes)
+        for number, opening, white, black in jobs:
+            report = play_game(number, opening, white, black, max_plies)
+            yield report, _first_engine_score(report, number)
+        return
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                               initargs=(book_path, tablebase_directory, table_megabytes))
+    try:
+        pending = set()
+        for number, opening, white, black in jobs:
+            pending.add(pool.submit(play_game, number, opening, white, black, max_plies))
+            if len(pending) >= workers * 2:
+                yield from _finished(pending)
+        while pending:
+            yield from _finished(pending)
+    finally:
+        # Reached early when the caller stops (SPRT decided): drop the games not started
+        pool.shutdown(cancel_futures=True)
+
+
+def _finished(pending):
+    """Wait for at least one game, remove the finished ones from pending and yield their results"""
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        pending.remove(future)
+        report = future.result()
+        yield report, _first_engine_score(report, report['game'])
+
+
+def _first_engine_score(report, number):
+    """1, 0.5 or 0 for the first engine, which has white in odd-numbered games"""
+    white_score = {'1-0': 1, '0-1': 0, '1/2-1/2': 0.5}[report['result']]
+    return white_score if number % 2 == 1 else 1 - white_score
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('engine1', help="first engine: level or level:key=value,...")
+    parser.add_argument('engine2', help="second engine, measured against")
+    parser.add_argument('--games', type=int, default=100, help='games to play (rounded up to pairs)')
+    parser.add_argument('--workers', type=int, default=1, help='processes to play games on')
+    parser.add_argument('--opening-plies', type=int, default=4, help='random moves before the engines take over')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random openings')
+    parser.add_argument('--max-plies', type=int, default=400, help='adjudicate a draw after this many plies')
+    parser.add_argument('--book', default=None, help=f"opening book for both engines (e.g. {DEFAULT_BOOK_PATH})")
+    parser.add_argument('--tablebases', default=DEFAULT_TABLEBASE_DIRECTORY,
+                        help='endgame tables for both engines and for adjudication')
+    parser.add_argument('--table-megabytes', type=float, default=DEFAULT_MEGABYTES,
+                        help='transposition table size of each engine')
+    parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'),
+                        help='stop when the SPRT accepts Elo <= ELO0 or Elo >= ELO1')
+    parser.add_argument('--alpha', type=float, default=0.05, help='SPRT false positive rate')
+    parser.add_argument('--beta', type=float, default=0.05, help='SPRT false negative rate')
+    args = parser.parse_args(argv)
+    try:
+        engines = (parse_engine(args.engine1), parse_engine(args.engine2))
+    except ValueError as error:
+        parser.error(str(error))
+
+    bounds = sprt_bounds(args.alpha, args.beta) if args.sprt else None
+    wins = draws = losses = 0
+    llr = decision = None
+    reasons = {}
+    start = time.perf_counter()
+    matches = run_match(engines, args.games + args.games % 2, args.workers, args.opening_plies, args.seed,
+                        args.max_plies, args.book, args.tablebases, args.table_megabytes)
+    try:
+        for report, score in matches:
+            wins += score == 1
+            draws += score == 0.5
+            losses += score == 0
+            reasons[report['reason']] = reasons.get(report['reason'], 0) + 1
+            sys.stdout.write(json.dumps(report) + '\n')
+            if bounds is not None:
+                llr = sprt_llr(wins, draws, losses, *args.sprt)
+                if llr <= bounds[0]:
+                    decision = 'H0'
+                elif llr >= bounds[1]:
+                    decision = 'H1'
+                if decision is not None:
+                    break
+    finally:
+        matches.close()
+    seconds = time.perf_counter() - start
+
+    games = wins + draws + losses
+    summary = {'engine1': args.engine1, 'engine2': args.engine2, 'games': games,
+               'wins': wins, 'draws': draws, 'losses': losses, 'reasons': reasons,
+               'workers': args.workers, 'seconds': round(seconds, 2),
+               'games_per_second': round(games / seconds, 3) if seconds > 0 else None}
+    if games:
+        elo, low, high = elo_interval(wins, draws, losses)
+        summary.update(score=round((wins + draws / 2) / games, 4),
+                       elo=elo and round(elo, 1), elo_95=[low and round(low, 1), high and round(high, 1)])
+    if bounds is not None:
+        summary['sprt'] = {'elo0': args.sprt[0], 'elo1': args.sprt[1], 'alpha': args.alpha, 'beta': args.beta,
+                           'llr': llr and round(llr, 3), 'bounds': [round(bound, 3) for bound in bounds],
+                           'decision': decision}
+    json.dump(summary, sys.stderr)
+    print(file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Fixed-size transposition table keyed by Zobrist hashes.
+
+The table lives in one flat array of unsigned 64-bit words, so its memory
+use is exactly the budget given to the constructor and never grows. Each
+bucket holds two (key, data) slots:
+
+- slot 0 is depth-preferred: it keeps the deepest result and is only
+  overwritten by a search at least as deep, or by any search once its
+  entry is left over from an earlier search;
+- slot 1 is always-replace: whatever slot 0 refused goes here, so recent
+  results are never lost.
+
+The data word packs the move, score, depth, bound type and search age.
+The key word is stored XOR-ed with the data word, so a slot half written
+by another process sharing the table (see parallel.py) fails the key
+check on probe instead of returning another position's data.
+"""
+
+from array import array
+
+from engine import PROMOTION_TYPES
+
+EXACT = 0
+LOWER_BOUND = 1  # The real score is at least the stored one (fail high)
+UPPER_BOUND = 2  # The real score is at most the stored one (fail low)
+
+WORDS_PER_BUCKET = 4  # Two (key, data) slots
+BYTES_PER_BUCKET = WORDS_PER_BUCKET * 8
+
+SCORE_OFFSET = 1 << 31
+MAX_DEPTH = 0xFF
+AGE_MASK = 0x1F
+USED = 1 << 63
+DEFAULT_MEGABYTES = 16
+
+
+def encode_move(move):
+    """Pack a move into 15 bits; 0 means no move"""
+    if move is None:
+        return 0
+    from_row, from_col, to_row, to_col, promotion = move
+    code = (from_row * 8 + from_col) << 6 | (to_row * 8 + to_col)
+    if promotion is not None:
+        code |= (PROMOTION_TYPES.index(promotion) + 1) << 12
+    return code
+
+
+def decode_move(code):
+    """Inverse of encode_move"""
+    if not code:
+        return None
+    from_square = code >> 6 & 0x3F
+    to_square = code & 0x3F
+    promotion = code >> 12 & 0x7
+    return (from_square >> 3, from_square & 7, to_square >> 3, to_square & 7,
+            PROMOTION_TYPES[promotion - 1] if promotion else None)
+
+
+def _pack(move_code, score, depth, flag, age):
+    return (USED | (age & AGE_MASK) << 58 | flag << 56 | min(max(depth, 0), MAX_DEPTH) << 48
+            | (score + SCORE_OFFSET) << 16 | move_code)
+
+
+def _unpack(data):
+    """(move, score, depth, flag) from a data word"""
+    return (decode_move(data & 0xFFFF), (data >> 16 & 0xFFFFFFFF) - SCORE_OFFSET,
+            data >> 48 & MAX_DEPTH, data >> 56 & 0x3)
+
+
+class TranspositionTable:
+    """Bounded cache of search results, sized by a memory budget in megabytes.
+
+    buffer, if given, is a writable buffer of at least that size (such as
+    a SharedMemory block) to keep the table in instead of a private array.
+    """
+
+    def __init__(self, megabytes=DEFAULT_MEGABYTES, buffer=None):
+        self.bucket_count = max(1, int(megabytes * 1024 * 1024) // BYTES_PER_BUCKET)
+        if buffer is None:
+            self.table = array('Q', bytes(self.bucket_count * BYTES_PER_BUCKET))
+        else:
+            self.table = memoryview(buffer)[:self.bucket_count * BYTES_PER_BUCKET].cast('Q')
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    @property
+    def size_bytes(self):
+        return self.bucket_count * BYTES_PER_BUCKET
+
+    def clear(self):
+        """Forget every entry"""
+        memoryview(self.table).cast('B')[:] = bytes(self.size_bytes)
+        self.age = 0
+
+    def new_search(self):
+        """Mark existing entries as old so the next search may replace them"""
+        self.age = (self.age + 1) & AGE_MASK
+
+    def probe(self, key):
+        """Return (move, score, depth, flag) stored for key, or None"""
+        table = self.table
+        index = (key % self.bucket_count) * WORDS_PER_BUCKET
+        self.probes += 1
+        data = table[index + 1]
+        if data and table[index] ^ data == key:
+            self.hits += 1
+            return _unpack(data)
+        data = table[index + 3]
+        if data and table[index + 2] ^ data == key:
+            self.hits += 1
+            return _unpack(data)
+        return None
+
+    def store(self, key, move, score, depth, flag):
+        """Record a search result for key"""
+        table = self.table
+        index = (key % self.bucket_count) * WORDS_PER_BUCKET
+        move_code = encode_move(move)
+        self.stores += 1
+
+        data = table[index + 1]
+        if (not data or table[index] ^ data == key or depth >= (data >> 48 & MAX_DEPTH)
+                or (data >> 58 & AGE_MASK) != self.age):
+            slot = index
+        else:
+            slot = index + 2
+            data = table[slot + 1]
+        # Keep the known best move when a result without one replaces it
+        if not move_code and data and table[slot] ^ data == key:
+            move_code = data & 0xFFFF
+        data = _pack(move_code, score, depth, flag, self.age)
+        table[slot] = key ^ data
+        table[slot + 1] = data
+
+    def hashfull(self):
+        """Permille of the first 1000 slots used by the current search"""
+        table = self.table
+        sample = min(500, self.bucket_count)
+        used = 0
+        for index in range(0, sample * WORDS_PER_BUCKET, 2):
+            data = table[index + 1]
+            if data and (data >> 58 & AGE_MASK) == self.age:
+                used += 1
+        return used * 1000 // (sample * 2)
@@ -0,0 +1,43 @@
+"""Zobrist keys for hashing chess positions.
+
+A position's hash is the XOR of one random 64-bit key per (piece, square),
+plus keys for black to move, the castling rights and the en passant file.
+engine.Position keeps its hash_key up to date by XOR-ing the keys that a
+move changes. The keys come from a fixed seed, so hashes are stable across
+processes and runs (opening books and shared tables rely on that).
+"""
+
+import random
+
+_random = random.Random(0x5EED_C4E55)
+
+
+def _key():
+    return _random.getrandbits(64)
+
+
+# PIECE_KEYS[color][piece_type][row * 8 + col]
+PIECE_KEYS = {
+    color: {piece_type: [_key() for _ in range(64)]
+            for piece_type in ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')}
+    for color in ('white', 'black')
+}
+
+BLACK_TO_MOVE_KEY = _key()
+
+# One key per castling right bit; CASTLING_KEYS[rights] combines them
+_CASTLING_RIGHT_KEYS = [_key() for _ in range(4)]
+
+
+def _combine_castling_keys(rights):
+    combined = 0
+    for bit, right_key in enumerate(_CASTLING_RIGHT_KEYS):
+        if rights >> bit & 1:
+            combined ^= right_key
+    return combined
+
+
+CASTLING_KEYS = [_combine_castling_keys(rights) for rights in range(16)]
+
+# Indexed by the file (column) of the en passant square
+EN_PASSANT_KEYS = [_key() for _ in range(8)]